@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+EVICT_INTERVAL_SECONDS = 60  # Minimum time between two eviction scans of a cache directory
+
+
+def file_hash(file_path: str) -> str:
+    """
+    Compute the SHA-256 hash of a file's content.
+
+    Args:
+        file_path: Path to the file
+
+    Returns:
+        Hex digest of the file content
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Persistent key/value cache storing one JSON file per entry in a directory.
+
+    Every entry stores its creation time; entries older than
+    max_age_seconds are dropped on access. When the directory grows beyond
+    max_bytes, the least recently used entries are evicted; reading an
+    entry refreshes its modification time, which only serves this LRU order.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_age_seconds: float):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._evict_lock = threading.Lock()
+        self._last_evict = 0.0
+
+    def _path(self, key: str) -> Path:
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return self.directory / f"{name}.json"
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Look up an entry.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The stored value, or None if missing, expired or unreadable
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if time.time() - entry['created'] > self.max_age_seconds:
+                path.unlink(missing_ok=True)
+                return None
+            os.utime(path)
+            return entry['value']
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Dropping unreadable cache entry {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+    def put(self, key: str, value: Dict) -> None:
+        """
+        Store an entry, replacing any previous value, and evict old entries
+        (at most once per EVICT_INTERVAL_SECONDS).
+
+        Args:
+            key: Cache key
+            value: JSON-serializable value
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        temp_path = None
+        try:
+            # A unique temp file per writer, so concurrent puts of one key cannot collide
+            fd, temp_name = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            temp_path = Path(temp_name)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'created': time.time(), 'value': value}, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {path.name}: {e}")
+            if temp_path is not None:
+                temp_path.unlink(missing_ok=True)
+            return
+
+        with self._evict_lock:
+            now = time.time()
+            if now - self._last_evict < EVICT_INTERVAL_SECONDS:
+                return
+            self._last_evict = now
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove expired entries and, if over max_bytes, the least recently used ones."""
+        now = time.time()
+        entries = []
+        for path in self.directory.glob('*.json'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            # Not read since longer than max_age_seconds, so also created before that
+            if now - stat.st_mtime > self.max_age_seconds:
+                path.unlink(missing_ok=True)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
@@ -0,0 +1,253 @@
+import json
+import logging
+import math
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Keywords for common category names, matched against the configured
+# categories by prefix (e.g. 'rechnung' seeds a category named 'Rechnungen')
+DEFAULT_KEYWORDS = {
+    'rechnung': ['rechnungsnummer', 'rechnungsdatum', 'rechnungsbetrag', 'zahlbar bis',
+                 'zahlungsfrist', 'mwst', 'mehrwertsteuer', 'einzahlungsschein', 'qr-rechnung'],
+    'bank': ['kontoauszug', 'iban', 'saldo', 'kontostand', 'buchungsdatum', 'valuta',
+             'kontonummer', 'depotauszug'],
+    'wohnung': ['mietvertrag', 'vermieter', 'mietzins', 'nebenkosten', 'nebenkostenabrechnung',
+                'liegenschaft', 'verwaltung', 'hauswart'],
+    'vertrag': ['vertragslaufzeit', 'vertragsbeginn', 'vertragspartner', 'kündigungsfrist',
+                'unterschrift', 'vereinbarung'],
+    'versicherung': ['versicherungsnummer', 'police', 'prämie', 'versicherungsnehmer',
+                     'deckung', 'selbstbehalt'],
+    'steuer': ['steuererklärung', 'steuerverwaltung', 'veranlagung', 'steuerrechnung',
+               'lohnausweis'],
+    'gesundheit': ['krankenkasse', 'arzt', 'diagnose', 'behandlung', 'rezept', 'leistungsabrechnung'],
+}
+
+MIN_KEYWORD_HITS = 2  # Fewer hits for the best category means no prediction
+CATEGORY_NAME_WEIGHT = 0.25  # A bare category name is weak evidence (e.g. 'Bank' in a payment slip)
+KEYWORD_HIT_SATURATION = 3  # Hits at which the hit count alone gives a rule confidence of 0.5
+MIN_TRAINING_DOCS = 20  # Documents in the history before the statistical model is used
+MIN_AGREEMENT_SAMPLES = 20  # Predictions checked against the LLM before the rules or the model are trusted
+TOKEN_PATTERN = re.compile(r'[a-zäöüß]{3,}')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase word tokens of at least 3 letters.
+
+    Args:
+        text: Text to tokenize
+
+    Returns:
+        List of tokens
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class CategoryClassifier:
+    """
+    Local document classifier used before the LLM vote.
+
+    A keyword-rules engine, seeded from the configured categories, is
+    combined with a multinomial naive Bayes model trained on the history of
+    past LLM categorizations once enough documents were seen.
+
+    Neither the naive Bayes posterior (close to 0 or 1 for almost any
+    document) nor the keyword share is a calibrated confidence. Instead,
+    every learned document first checks the predictions of the rules and
+    the model against the LLM's category; each is only used after
+    MIN_AGREEMENT_SAMPLES such checks, and its confidence is capped by its
+    measured agreement rate.
+    """
+
+    def __init__(self, categories: List[str], extra_keywords: Optional[Dict[str, List[str]]] = None,
+                 history_path: Optional[str] = None):
+        """
+        Args:
+            categories: Category names (the 'Unsicher' fallback is never predicted)
+            extra_keywords: Optional additional keywords per category name
+            history_path: JSON file holding the training history, if any
+        """
+        self.categories = [c for c in categories if c != 'Unsicher']
+        self.keywords = self._seed_keywords(extra_keywords or {})
+        self.history_path = Path(history_path) if history_path else None
+        self._lock = threading.Lock()
+        self._history: Dict[str, Dict] = {}
+        self._agreement = {source: {'compared': 0, 'agreed': 0} for source in ('rules', 'bayes')}
+        self._load_history()
+
+    def _seed_keywords(self, extra_keywords: Dict[str, List[str]]) -> Dict[str, Dict[Tuple[str, ...], float]]:
+        """Keywords per category as token sequences with their weight."""
+        keywords = {}
+        for category in self.categories:
+            name = category.lower()
+            words = []
+            for stem, stem_words in DEFAULT_KEYWORDS.items():
+                if name.startswith(stem) or stem.startswith(name):
+                    words += stem_words
+            words += extra_keywords.get(category, [])
+            weights = {tuple(tokenize(word)): 1.0 for word in words}
+            name_tokens = tuple(tokenize(name))
+            if name_tokens not in weights:
+                weights[name_tokens] = CATEGORY_NAME_WEIGHT
+            keywords[category] = {phrase: weight for phrase, weight in weights.items() if phrase}
+        return keywords
+
+    def _load_history(self) -> None:
+        if not self.history_path or not self.history_path.exists():
+            return
+        try:
+            with open(self.history_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable classifier history {self.history_path}: {e}")
+            return
+        if 'categories' in data:
+            self._history = data['categories']
+            agreement = data.get('agreement', {})
+            if 'compared' in agreement:
+                # Written when only the model's agreement was tracked
+                agreement = {'bayes': agreement}
+            for source, counts in agreement.items():
+                if source in self._agreement:
+                    self._agreement[source].update(counts)
+        else:
+            # History written before the agreement was tracked
+            self._history = data
+
+    def _keyword_scores(self, text: str) -> Dict[str, float]:
+        """Weighted whole-token keyword hits per category."""
+        tokens = tokenize(text)
+        counts: Dict[Tuple[str, ...], int] = {}
+        for length in {len(phrase) for words in self.keywords.values() for phrase in words}:
+            for i in range(len(tokens) - length + 1):
+                phrase = tuple(tokens[i:i + length])
+                counts[phrase] = counts.get(phrase, 0) + 1
+        return {category: sum(counts.get(phrase, 0) * weight for phrase, weight in words.items())
+                for category, words in self.keywords.items()}
+
+    def _rule_prediction(self, text: str) -> Tuple[Optional[str], float]:
+        """Best keyword category and its uncalibrated confidence (hit share scaled by hit count)."""
+        scores = self._keyword_scores(text)
+        total = sum(scores.values())
+        if total <= 0 or max(scores.values()) < MIN_KEYWORD_HITS:
+            return None, 0.0
+        category = max(scores, key=scores.get)
+        hits = scores[category]
+        return category, scores[category] / total * hits / (hits + KEYWORD_HIT_SATURATION)
+
+    def _bayes_probabilities(self, text: str) -> Optional[Dict[str, float]]:
+        history = {c: h for c, h in self._history.items() if c in self.categories}
+        total_docs = sum(h['docs'] for h in history.values())
+        if total_docs < MIN_TRAINING_DOCS:
+            return None
+
+        vocabulary = set()
+        for h in history.values():
+            vocabulary.update(h['tokens'])
+        tokens = tokenize(text)
+
+        log_probs = {}
+        for category, h in history.items():
+            token_total = sum(h['tokens'].values())
+            log_prob = math.log(h['docs'] / total_docs)
+            for token in tokens:
+                log_prob += math.log((h['tokens'].get(token, 0) + 1) / (token_total + len(vocabulary)))
+            log_probs[category] = log_prob
+
+        # Normalize in log space to avoid underflow
+        top = max(log_probs.values())
+        exp_probs = {c: math.exp(lp - top) for c, lp in log_probs.items()}
+        norm = sum(exp_probs.values())
+        return {c: p / norm for c, p in exp_probs.items()}
+
+    def _measured_agreement(self, source: str) -> Optional[float]:
+        counts = self._agreement[source]
+        if counts['compared'] < MIN_AGREEMENT_SAMPLES:
+            return None
+        return counts['agreed'] / counts['compared']
+
+    def _check_agreement(self, source: str, predicted: Optional[str], category: str) -> None:
+        if predicted is None:
+            return
+        counts = self._agreement[source]
+        counts['compared'] += 1
+        if predicted == category:
+            counts['agreed'] += 1
+
+    def predict(self, text: str) -> Tuple[Optional[str], float]:
+        """
+        Predict the category of a document.
+
+        Args:
+            text: Document text
+
+        Returns:
+            Tuple of (category or None, confidence between 0 and 1)
+        """
+        rule_category, rule_confidence = None, 0.0
+        bayes_category, bayes_confidence = None, 0.0
+        with self._lock:
+            rule_agreement = self._measured_agreement('rules')
+            bayes_agreement = self._measured_agreement('bayes')
+            bayes = self._bayes_probabilities(text) if bayes_agreement is not None else None
+        if rule_agreement is not None:
+            rule_category, rule_confidence = self._rule_prediction(text)
+            rule_confidence = min(rule_confidence, rule_agreement)
+        if bayes:
+            bayes_category = max(bayes, key=bayes.get)
+            bayes_confidence = min(bayes[bayes_category], bayes_agreement)
+
+        if rule_category is None or bayes_category is None:
+            if rule_category is not None:
+                return rule_category, rule_confidence
+            return bayes_category, bayes_confidence
+        if rule_category == bayes_category:
+            return rule_category, max(rule_confidence, bayes_confidence)
+        # The models disagree: the more confident one wins, with reduced confidence
+        if rule_confidence >= bayes_confidence:
+            return rule_category, rule_confidence - bayes_confidence
+        return bayes_category, bayes_confidence - rule_confidence
+
+    def learn(self, text: str, category: str) -> None:
+        """
+        Add a categorized document to the training history. Before that,
+        the predictions of the rules and the model for it are compared with
+        the category to measure their agreement.
+
+        Args:
+            text: Document text
+            category: Category decided for the document
+        """
+        if category not in self.categories:
+            return
+        rule_category, _ = self._rule_prediction(text)
+        with self._lock:
+            self._check_agreement('rules', rule_category, category)
+            bayes = self._bayes_probabilities(text)
+            self._check_agreement('bayes', max(bayes, key=bayes.get) if bayes else None, category)
+            entry = self._history.setdefault(category, {'docs': 0, 'tokens': {}})
+            entry['docs'] += 1
+            for token in tokenize(text):
+                entry['tokens'][token] = entry['tokens'].get(token, 0) + 1
+
+    def save(self) -> None:
+        """Write the training history to history_path, if configured."""
+        if not self.history_path:
+            return
+        with self._lock:
+            try:
+                self.history_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.history_path, 'w', encoding='utf-8') as f:
+                    json.dump({'categories': self._history, 'agreement': self._agreement},
+                              f, ensure_ascii=False)
+            except OSError as e:
+                logger.warning(f"Failed to save classifier history: {e}")
@@ -1,9 +1,17 @@
+import binascii
 import email
+import email.header
 import imaplib
 import logging
+import os
 import random
+import re
+import socket
+import threading
+import time
+import urllib.parse
 from pathlib import Path
-from typing import Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from ConfigReader import Config
 
@@ -14,179 +22,678 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-
-def download_new_scanned_emails(
-    email_user: str,
-    email_pass: str,
-    email_server: str,
-    subject: str,
-    storage_dir: Path
-) -> int:
+STORAGE_BASE_DIR = Path('input')
+IMAP_FETCH_BATCH_SIZE = 25  # Messages per UID FETCH round trip
+PART_CHUNK_SIZE = 1024 * 1024  # Bytes of an attachment fetched per partial FETCH
+IDLE_REFRESH_SECONDS = 9 * 60  # Renew IDLE well before the 29 minute limit of RFC 2177 and NAT timeouts
+POLL_INTERVAL = 60  # Seconds between checks on servers without IDLE
+RECONNECT_DELAY = 5  # Seconds before the first reconnect, doubled per failure
+MAX_RECONNECT_DELAY = 300  # Seconds
+NEW_MAIL_PATTERN = re.compile(rb'\* \d+ (EXISTS|RECENT)', re.IGNORECASE)
+
+# Category (subdirectory of STORAGE_BASE_DIR) per email subject of the scanner
+EMAIL_SUBJECTS = {
+    'Ablegen': 'Scan-Ablegen',
+    'Steuern': 'Scan-Steuern',
+    '1und1macht3': 'Scan-1und1macht3',
+    'Rezepte': 'Rezept'
+}
+
+
+def connect(email_user: str, email_pass: str, email_server: str) -> imaplib.IMAP4_SSL:
     """
-    Download email attachments with a specific subject and delete the emails.
+    Open an authenticated IMAP session with the inbox selected.
 
     Args:
         email_user: Email account username
         email_pass: Email account password
         email_server: IMAP server address
-        subject: Subject line to search for
-        storage_dir: Directory to save attachments
 
     Returns:
-        Number of attachments downloaded
+        The connected IMAP session
 
     Raises:
-        imaplib.IMAP4.error: If IMAP operations fail
-        Exception: For other email processing errors
+        imaplib.IMAP4.error: If login or select fails
     """
-    download_count = 0
-    mail = None
-
+    logger.debug(f"Connecting to {email_server} as {email_user}")
+    mail = imaplib.IMAP4_SSL(email_server)
     try:
-        # Connect and login
-        logger.debug(f"Connecting to {email_server} as {email_user}")
-        mail = imaplib.IMAP4_SSL(email_server)
         mail.login(email_user, email_pass)
+        # Servers such as Dovecot and Gmail only advertise UIDPLUS (and IDLE) after login
+        typ, data = mail.capability()
+        if typ == 'OK' and data and data[-1]:
+            mail.capabilities = tuple(data[-1].decode('ascii', 'replace').upper().split())
         mail.select("inbox")
+    except Exception:
+        mail.logout()
+        raise
+    return mail
 
-        # Search for emails with specific subject
-        logger.debug(f"Searching for emails with subject: {subject}")
-        result, data = mail.uid('search', None, f'(HEADER Subject "{subject}")')
 
+def build_subject_search(subjects: List[str], deleted: bool = False) -> str:
+    """
+    Build an IMAP search matching any of the given subjects.
+    IMAP OR takes exactly two keys, so the alternatives are nested.
+
+    Args:
+        subjects: Subject substrings to search for
+        deleted: If True, match only emails flagged as deleted, otherwise
+            only emails that are not
+
+    Returns:
+        IMAP search criteria
+    """
+    criteria = f'HEADER Subject "{subjects[-1]}"'
+    for subject in reversed(subjects[:-1]):
+        criteria = f'OR HEADER Subject "{subject}" {criteria}'
+    flag = 'DELETED' if deleted else 'UNDELETED'
+    return f'({flag} ({criteria}))'
+
+
+def decode_subject(raw_subject: Optional[str]) -> str:
+    """
+    Decode a possibly MIME-encoded Subject header.
+
+    Args:
+        raw_subject: Raw header value
+
+    Returns:
+        Decoded subject, empty if missing
+    """
+    if not raw_subject:
+        return ''
+    return str(email.header.make_header(email.header.decode_header(raw_subject)))
+
+
+def route_subject(subject: str, email_subjects: Dict[str, str]) -> Optional[str]:
+    """
+    Find the category of a message from its subject. Like the IMAP search,
+    subjects match case-insensitively as substrings; if several configured
+    subjects match, the longest (most specific) one wins.
+
+    Args:
+        subject: Decoded subject of the message
+        email_subjects: Mapping of category to subject substring
+
+    Returns:
+        Category, or None if no configured subject matches
+    """
+    subject = subject.lower()
+    matches = [(len(pattern), category) for category, pattern in email_subjects.items()
+               if pattern.lower() in subject]
+    if not matches:
+        return None
+    return max(matches)[1]
+
+
+def format_uid_set(uids: List[str]) -> str:
+    """
+    Format UIDs as a compact IMAP sequence set (e.g. '3:7,12').
+
+    Args:
+        uids: Message UIDs
+
+    Returns:
+        IMAP sequence set
+    """
+    numbers = sorted(int(uid) for uid in uids)
+    ranges = []
+    start = prev = numbers[0]
+    for number in numbers[1:]:
+        if number != prev + 1:
+            ranges.append(f"{start}:{prev}" if start != prev else str(start))
+            start = number
+        prev = number
+    ranges.append(f"{start}:{prev}" if start != prev else str(start))
+    return ",".join(ranges)
+
+
+def parse_imap_data(response: List) -> List[Any]:
+    """
+    Parse imaplib response data into nested Python values. Parenthesized
+    lists become lists, NIL becomes None, quoted strings and atoms become
+    str and literals (which imaplib returns as separate tuple items) bytes.
+    Section specifiers such as BODY[HEADER.FIELDS (SUBJECT)]<0> stay one atom.
+
+    Args:
+        response: Data returned by an imaplib command
+
+    Returns:
+        List of top-level values
+    """
+    stream = b''
+    literals = []
+    for item in response:
+        if isinstance(item, tuple):
+            stream += item[0]
+            literals.append(item[1])
+        elif item:
+            stream += item
+    literals.reverse()
+    pos = 0
+
+    def parse_value() -> Any:
+        nonlocal pos
+        char = stream[pos:pos + 1]
+        if char == b'(':
+            pos += 1
+            values = []
+            while True:
+                while stream[pos:pos + 1] == b' ':
+                    pos += 1
+                if stream[pos:pos + 1] in (b')', b''):
+                    pos += 1
+                    return values
+                values.append(parse_value())
+        if char == b'"':
+            pos += 1
+            value = bytearray()
+            while pos < len(stream) and stream[pos:pos + 1] != b'"':
+                if stream[pos:pos + 1] == b'\\':
+                    pos += 1
+                value += stream[pos:pos + 1]
+                pos += 1
+            pos += 1
+            return value.decode('utf-8', errors='replace')
+        if char == b'{':
+            pos = stream.index(b'}', pos) + 1
+            return literals.pop()
+        start = pos
+        depth = 0
+        while pos < len(stream):
+            char = stream[pos:pos + 1]
+            if char in (b'[', b'<'):
+                depth += 1
+            elif char in (b']', b'>'):
+                depth -= 1
+            elif depth == 0 and char in (b' ', b'(', b')'):
+                break
+            pos += 1
+        atom = stream[start:pos].decode('utf-8', errors='replace')
+        return None if atom.upper() == 'NIL' else atom
+
+    values = []
+    while pos < len(stream):
+        if stream[pos:pos + 1] in (b' ', b')'):
+            pos += 1
+            continue
+        values.append(parse_value())
+    return values
+
+
+def parse_fetch_response(response: List) -> Dict[str, Dict[str, Any]]:
+    """
+    Map the data items of a (multi-message) UID FETCH response to their UIDs.
+
+    Args:
+        response: Data returned by imaplib for a UID FETCH
+
+    Returns:
+        Dictionary of UID to {data item name (upper case): value}
+    """
+    messages = {}
+    for value in parse_imap_data(response):
+        if not isinstance(value, list):
+            continue
+        items = {str(name).upper(): item for name, item in zip(value[::2], value[1::2])}
+        if 'UID' in items:
+            messages[items['UID']] = items
+    return messages
+
+
+def decode_parameter_value(params: Optional[List], name: str) -> Optional[str]:
+    """
+    Read a parameter from a BODYSTRUCTURE parameter list, decoding RFC 2231
+    (name*=) and RFC 2047 (=?...?=) encodings.
+
+    Args:
+        params: Flat [name, value, name, value, ...] list, or None
+        name: Parameter name
+
+    Returns:
+        Decoded value, or None if the parameter is missing
+    """
+    values = {}
+    for key, value in zip((params or [])[::2], (params or [])[1::2]):
+        if isinstance(value, bytes):
+            value = value.decode('utf-8', errors='replace')
+        values[str(key).lower()] = value
+    if isinstance(values.get(name), str):
+        return decode_subject(values[name])
+    # RFC 2231: name*=charset'lang'value, possibly split into name*0*, name*1*, ...
+    sections = sorted((key for key in values if key.startswith(f'{name}*')),
+                      key=lambda key: int(re.sub(r'\D', '', key) or 0))
+    if sections:
+        encoded = ''.join(str(values[key]) for key in sections)
+        if encoded.count("'") < 2:
+            return encoded
+        charset, _, value = encoded.split("'", 2)
+        try:
+            return urllib.parse.unquote_to_bytes(value).decode(charset or 'us-ascii', errors='replace')
+        except LookupError:
+            return urllib.parse.unquote(value)
+    return None
+
+
+def find_attachments(bodystructure: List, prefix: str = '') -> List[Tuple[str, Optional[str], str]]:
+    """
+    List the attachment parts of a message from its BODYSTRUCTURE: every
+    non-multipart part with a Content-Disposition, including the parts of
+    attached messages.
+
+    Args:
+        bodystructure: Parsed BODYSTRUCTURE value
+        prefix: Part number of the enclosing message part ('' at top level)
+
+    Returns:
+        List of (IMAP part number, filename or None, transfer encoding)
+    """
+    if isinstance(bodystructure[0], list):
+        # Multipart: the leading lists are the parts, followed by the subtype
+        parts = []
+        for part in bodystructure:
+            if not isinstance(part, list):
+                break
+            parts.append(part)
+        children = [(part, f"{prefix}.{i}" if prefix else str(i)) for i, part in enumerate(parts, start=1)]
+    else:
+        children = [(bodystructure, f"{prefix}.1" if prefix else '1')]
+
+    attachments = []
+    for child, number in children:
+        if isinstance(child[0], list):
+            attachments.extend(find_attachments(child, number))
+            continue
+        maintype, subtype = str(child[0]).lower(), str(child[1]).lower()
+        if maintype == 'message' and subtype == 'rfc822':
+            # The attached message's own parts are numbered below this part
+            attachments.extend(find_attachments(child[8], number))
+            continue
+        # Extension data follows the type specific fields
+        disposition_index = {'text': 9, 'message': 11}.get(maintype, 8)
+        disposition = child[disposition_index] if len(child) > disposition_index else None
+        if not isinstance(disposition, list):
+            continue
+        filename = (decode_parameter_value(disposition[1], 'filename') or
+                    decode_parameter_value(child[2], 'name'))
+        attachments.append((number, filename, str(child[5] or '7bit').lower()))
+    return attachments
+
+
+def iter_part_chunks(mail: imaplib.IMAP4_SSL, uid: str, part: str,
+                     chunk_size: int = PART_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Fetch a body part in partial FETCH chunks (BODY.PEEK[part]<offset.length>),
+    so only one chunk of it is in memory at a time.
+
+    Args:
+        mail: Connected IMAP session
+        uid: Message UID
+        part: IMAP part number
+        chunk_size: Bytes per FETCH
+
+    Yields:
+        Transfer-encoded part data
+
+    Raises:
+        imaplib.IMAP4.error: If a FETCH fails
+    """
+    offset = 0
+    while True:
+        result, response = mail.uid('fetch', uid, f'(BODY.PEEK[{part}]<{offset}.{chunk_size}>)')
         if result != 'OK':
-            logger.warning(f"Search failed for subject '{subject}'")
-            return 0
+            raise imaplib.IMAP4.error(f"Fetching part {part} of email {uid} failed")
+        items = parse_fetch_response(response).get(uid, {})
+        chunk = next((value for name, value in items.items() if name.startswith('BODY[')), None)
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        offset += len(chunk)
+
+
+def decode_transfer_chunks(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """
+    Incrementally undo a Content-Transfer-Encoding. Input that cannot be
+    decoded yet (an incomplete base64 quantum or quoted-printable line) is
+    carried over to the next chunk. An incomplete base64 quantum at the end
+    is padded, and a single leftover character dropped, with a warning
+    rather than an error, like get_payload(decode=True) does.
+
+    Args:
+        chunks: Encoded data
+        encoding: Transfer encoding (base64, quoted-printable, 7bit, 8bit, binary)
+
+    Yields:
+        Decoded data
+    """
+    if encoding not in ('base64', 'quoted-printable'):
+        yield from chunks
+        return
+
+    pending = b''
+    for chunk in chunks:
+        if encoding == 'base64':
+            data = pending + re.sub(rb'[^A-Za-z0-9+/=]', b'', chunk)
+            usable = len(data) - len(data) % 4
+            data, pending = data[:usable], data[usable:]
+            if data:
+                yield binascii.a2b_base64(data)
+        else:
+            data = pending + chunk
+            cut = data.rfind(b'\n') + 1
+            data, pending = data[:cut], data[cut:]
+            if data:
+                yield binascii.a2b_qp(data)
+    if pending and encoding == 'base64':
+        # Unpadded or truncated tail, which mail clients decode leniently as well
+        if len(pending) % 4 == 1:
+            logger.warning("Dropping a stray base64 character at the end of an attachment")
+            pending = pending[:-1]
+        if pending:
+            yield binascii.a2b_base64(pending + b'=' * (-len(pending) % 4))
+    elif pending:
+        yield binascii.a2b_qp(pending)
+
+
+def write_file_durably(file_path: Path, chunks: Iterable[bytes]) -> int:
+    """
+    Write a file so that it is complete on disk once this returns: the data
+    goes to a temporary file that is synced and then renamed into place.
+    Nothing is written if there is no data.
+
+    Args:
+        file_path: Target path
+        chunks: File content
+
+    Returns:
+        Number of bytes written
+    """
+    temp_path = file_path.with_name(f".{file_path.name}.part")
+    size = 0
+    try:
+        with open(temp_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        if size:
+            os.replace(temp_path, file_path)
+        else:
+            temp_path.unlink()
+    except Exception:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return size
+
+
+def save_attachments(mail: imaplib.IMAP4_SSL, uid: str, bodystructure: List,
+                     storage_dir: Path, subject: str,
+                     on_saved: Optional[Callable[[Path], None]] = None) -> int:
+    """
+    Save the attachments of an email to a directory, streaming each part
+    from the server straight to disk. Existing files are not overwritten.
+
+    Args:
+        mail: Connected IMAP session
+        uid: Message UID
+        bodystructure: Parsed BODYSTRUCTURE of the message
+        storage_dir: Directory to save attachments
+        subject: Configured subject, used to name attachments without filename
+        on_saved: Called with the path of every saved attachment
+
+    Returns:
+        Number of attachments saved
+
+    Raises:
+        imaplib.IMAP4.error: If fetching an attachment fails
+        OSError: If an attachment could not be written
+    """
+    attachment_count = 0
+    for part, filename, encoding in find_attachments(bodystructure):
+        # Generate unique filename
+        if not filename:
+            filename = f'{subject}_{random.randint(1, 10000000)}.pdf'
 
-        email_ids = data[0].split()
-        if not email_ids:
-            logger.debug(f"No emails found with subject '{subject}'")
-            return 0
+        file_path = storage_dir / Path(filename).name
 
-        email_ids = [e_id.decode() for e_id in email_ids]
-        logger.debug(f"Found {len(email_ids)} email(s) with subject '{subject}'")
+        # Save attachment if it doesn't exist
+        if not file_path.exists():
+            chunks = decode_transfer_chunks(iter_part_chunks(mail, uid, part), encoding)
+            if write_file_durably(file_path, chunks):
+                attachment_count += 1
+                logger.info(f"Saved attachment: {filename}")
+                if on_saved is not None:
+                    on_saved(file_path)
+    return attachment_count
 
-        # Process each email
-        for e_id in email_ids:
+
+def download_new_scanned_emails(
+    mail: imaplib.IMAP4_SSL,
+    email_subjects: Dict[str, str],
+    storage_dirs: Dict[str, Path],
+    batch_size: int = IMAP_FETCH_BATCH_SIZE,
+    on_saved: Optional[Callable[[Path], None]] = None
+) -> Dict[str, int]:
+    """
+    Download the attachments of all emails matching any of the configured
+    subjects with one search, save them to the directory of the category
+    the subject belongs to, and delete the emails.
+
+    Structure and subject are fetched batch_size messages at a time; only
+    the attachment parts are then downloaded, in PART_CHUNK_SIZE pieces
+    decoded straight to disk, so memory use does not grow with the size of
+    an email. An email is flagged as
+    deleted only once all its attachments are on disk, and the mailbox is
+    expunged once at the end (only the flagged UIDs if the server supports
+    UIDPLUS). Emails already flagged are never downloaded again; ones left
+    over by an interrupted run are expunged first.
+
+    Args:
+        mail: Connected IMAP session with the inbox selected (see connect)
+        email_subjects: Mapping of category to subject substring
+        storage_dirs: Mapping of category to directory for its attachments
+        batch_size: Number of messages per UID FETCH
+        on_saved: Called with the path of every saved attachment, as soon
+            as it is on disk
+
+    Returns:
+        Number of attachments downloaded per category
+
+    Raises:
+        imaplib.IMAP4.error: If IMAP operations fail
+    """
+    download_counts = {category: 0 for category in email_subjects}
+    expunge_leftovers(mail, list(email_subjects.values()))
+
+    logger.debug(f"Searching for emails with subjects: {list(email_subjects.values())}")
+    result, data = mail.uid('search', None, build_subject_search(list(email_subjects.values())))
+
+    if result != 'OK':
+        logger.warning("Search for scanned emails failed")
+        return download_counts
+
+    email_ids = data[0].split()
+    if not email_ids:
+        logger.debug("No scanned emails found")
+        return download_counts
+
+    email_ids = [e_id.decode() for e_id in email_ids]
+    logger.debug(f"Found {len(email_ids)} scanned email(s)")
+
+    deleted_ids = []
+    for batch_start in range(0, len(email_ids), batch_size):
+        batch = email_ids[batch_start:batch_start + batch_size]
+        result, response = mail.uid('fetch', format_uid_set(batch),
+                                    '(BODYSTRUCTURE BODY.PEEK[HEADER.FIELDS (SUBJECT)])')
+        if result != 'OK':
+            logger.warning(f"Failed to fetch emails {batch[0]}-{batch[-1]}")
+            continue
+        fetched = parse_fetch_response(response)
+
+        saved_ids = []
+        for e_id in batch:
+            items = fetched.get(e_id, {})
+            header = next((value for name, value in items.items() if name.startswith('BODY[HEADER')), None)
+            if isinstance(header, str):
+                header = header.encode('utf-8')
+            if 'BODYSTRUCTURE' not in items or not isinstance(header, bytes):
+                logger.warning(f"Failed to fetch email {e_id}")
+                continue
             try:
-                _, response = mail.uid('fetch', e_id, '(BODY.PEEK[])')
-                if not response or not response[0]:
-                    logger.warning(f"Failed to fetch email {e_id}")
+                raw_subject = email.message_from_bytes(header)['Subject']
+                category = route_subject(decode_subject(raw_subject), email_subjects)
+                if category is None:
+                    # The server matched a header the subject decoding does not reproduce
+                    logger.warning(f"Email {e_id} matches no configured subject, leaving it in the inbox")
                     continue
 
-                raw_email = response[0][1].decode('utf-8', errors='ignore')
-                email_message = email.message_from_string(raw_email)
-
-                # Process attachments
-                attachment_count = 0
-                for part in email_message.walk():
-                    if part.get_content_maintype() == 'multipart':
-                        continue
-                    if part.get('Content-Disposition') is None:
-                        continue
-
-                    # Generate unique filename
-                    filename = part.get_filename()
-                    if not filename:
-                        filename = f'{subject}_{random.randint(1, 10000000)}.pdf'
-
-                    file_path = storage_dir / filename
-
-                    # Save attachment if it doesn't exist
-                    if not file_path.exists():
-                        try:
-                            payload = part.get_payload(decode=True)
-                            if payload:
-                                file_path.write_bytes(payload)
-                                download_count += 1
-                                attachment_count += 1
-                                logger.info(f"Saved attachment: {filename}")
-                        except Exception as e:
-                            logger.error(f"Failed to save attachment {filename}: {e}")
-
+                attachment_count = save_attachments(
+                    mail, e_id, items['BODYSTRUCTURE'], storage_dirs[category], email_subjects[category],
+                    on_saved
+                )
+                download_counts[category] += attachment_count
                 if attachment_count > 0:
-                    logger.debug(f"Downloaded {attachment_count} attachment(s) from email {e_id}")
-
-                # Delete the email
-                result = mail.uid('STORE', e_id, '+FLAGS', r'(\Deleted)')
-                if result[0] == 'OK':
-                    mail.expunge()
-                    logger.debug(f"Deleted email {e_id}")
-                else:
-                    logger.warning(f"Failed to delete email {e_id}")
+                    logger.debug(f"Downloaded {attachment_count} attachment(s) from email {e_id} ({category})")
+                saved_ids.append(e_id)
 
             except Exception as e:
-                logger.error(f"Error processing email {e_id}: {e}")
+                logger.error(f"Error processing email {e_id}, keeping it: {e}")
                 continue
 
-    except imaplib.IMAP4.error as e:
-        logger.error(f"IMAP error: {e}")
-        raise
-    except Exception as e:
-        logger.error(f"Unexpected error during email download: {e}")
-        raise
-    finally:
-        # Ensure connection is closed
-        if mail:
-            try:
-                mail.logout()
-                logger.debug("Logged out from email server")
-            except Exception as e:
-                logger.warning(f"Error during logout: {e}")
+        # Flag the emails whose attachments are on disk
+        if saved_ids:
+            result = mail.uid('STORE', format_uid_set(saved_ids), '+FLAGS', r'(\Deleted)')
+            if result[0] == 'OK':
+                deleted_ids.extend(saved_ids)
+            else:
+                logger.warning(f"Failed to delete emails {saved_ids}")
+
+    if deleted_ids:
+        expunge_emails(mail, deleted_ids)
+
+    return download_counts
+
+
+def expunge_emails(mail: imaplib.IMAP4_SSL, uids: List[str]) -> None:
+    """
+    Permanently remove emails flagged as deleted. With UIDPLUS only the
+    given UIDs are expunged, so messages flagged by other clients are left
+    alone; otherwise the whole mailbox is expunged.
+
+    Args:
+        mail: Connected IMAP session
+        uids: UIDs flagged as deleted by this session
+    """
+    if 'UIDPLUS' in mail.capabilities:
+        result = mail.uid('EXPUNGE', format_uid_set(uids))
+    else:
+        result = mail.expunge()
+    if result[0] == 'OK':
+        logger.debug(f"Deleted {len(uids)} email(s)")
+    else:
+        logger.warning(f"Expunge failed for {len(uids)} email(s)")
 
-    return download_count
+
+def expunge_leftovers(mail: imaplib.IMAP4_SSL, subjects: List[str]) -> None:
+    """
+    Expunge scan emails that an earlier session flagged as deleted but
+    did not get to expunge, e.g. because the run was interrupted.
+
+    Args:
+        mail: Connected IMAP session with the inbox selected
+        subjects: Subject substrings of the scan emails
+    """
+    result, data = mail.uid('search', None, build_subject_search(subjects, deleted=True))
+    if result != 'OK' or not data[0]:
+        return
+    uids = [uid.decode() for uid in data[0].split()]
+    logger.info(f"Expunging {len(uids)} email(s) left flagged by an earlier run")
+    expunge_emails(mail, uids)
 
 
-def init_and_download(config: Config) -> Tuple[int, int, int]:
+def get_email_credentials(config: Config) -> Tuple[str, str, str]:
     """
-    Initialize storage directories and download emails from configured subjects.
+    Read the email account settings from the configuration.
 
     Args:
         config: Configuration object with email credentials
 
     Returns:
-        Tuple of (ablegen_count, steuern_count, business_count)
+        Tuple of (username, password, server)
 
     Raises:
-        Exception: If email download fails
+        ValueError: If the email configuration is incomplete
     """
     try:
-        username = config.EMAIL_USER
-        server = config.EMAIL_SERVER
-        password = config.EMAIL_PASSWORD
+        return config.EMAIL_USER, config.EMAIL_PASSWORD, config.EMAIL_SERVER
     except AttributeError as e:
         logger.error(f"Missing email configuration: {e}")
         raise ValueError("Email configuration incomplete") from e
 
-    # Create storage directories
-    base_dir = Path('input')
-    storage_dirs = {
-        'Ablegen': base_dir / 'Ablegen',
-        'Steuern': base_dir / 'Steuern',
-        '1und1macht3': base_dir / '1und1macht3',
-        'Rezepte': base_dir / 'Rezepte'
-    }
 
-    for dir_name, dir_path in storage_dirs.items():
+def create_storage_dirs() -> Dict[str, Path]:
+    """
+    Create the input directory of every category.
+
+    Returns:
+        Mapping of category to its directory
+    """
+    storage_dirs = {category: STORAGE_BASE_DIR / category for category in EMAIL_SUBJECTS}
+    for dir_path in storage_dirs.values():
         dir_path.mkdir(parents=True, exist_ok=True)
+    return storage_dirs
 
-    # Download emails for each category
-    download_counts = {}
-    email_subjects = {
-        'Ablegen': 'Scan-Ablegen',
-        'Steuern': 'Scan-Steuern',
-        '1und1macht3': 'Scan-1und1macht3',
-        'Rezepte': 'Rezept'
-    }
 
-    for category, subject in email_subjects.items():
-        try:
-            count = download_new_scanned_emails(
-                username, password, server, subject, storage_dirs[category]
-            )
-            download_counts[category] = count
-        except Exception as e:
-            logger.error(f"Failed to download emails for {category}: {e}")
-            download_counts[category] = 0
+def logout(mail: imaplib.IMAP4_SSL) -> None:
+    """
+    Close an IMAP session, logging instead of raising on errors.
+
+    Args:
+        mail: IMAP session
+    """
+    try:
+        mail.logout()
+        logger.debug("Logged out from email server")
+    except Exception as e:
+        logger.warning(f"Error during logout: {e}")
+
+
+def init_and_download(config: Config,
+                      on_saved: Optional[Callable[[Path], None]] = None) -> Tuple[int, int, int, int]:
+    """
+    Initialize storage directories and download emails for all configured
+    subjects over a single IMAP session.
+
+    Args:
+        config: Configuration object with email credentials
+        on_saved: Called with the path of every saved attachment
+
+    Returns:
+        Tuple of (ablegen_count, steuern_count, business_count, rezepte_count)
+
+    Raises:
+        ValueError: If the email configuration is incomplete
+    """
+    username, password, server = get_email_credentials(config)
+    storage_dirs = create_storage_dirs()
+
+    download_counts = {category: 0 for category in EMAIL_SUBJECTS}
+    mail = None
+    try:
+        mail = connect(username, password, server)
+        download_counts = download_new_scanned_emails(mail, EMAIL_SUBJECTS, storage_dirs,
+                                                      on_saved=on_saved)
+    except Exception as e:
+        logger.error(f"Failed to download emails: {e}")
+    finally:
+        # Ensure connection is closed
+        if mail:
+            logout(mail)
 
     total = sum(download_counts.values())
     logger.info(
@@ -205,12 +712,132 @@ def init_and_download(config: Config) -> Tuple[int, int, int]:
     )
 
 
+def idle_wait(mail: imaplib.IMAP4_SSL, timeout: float) -> bool:
+    """
+    Wait for new messages with IMAP IDLE (RFC 2177). imaplib has no IDLE
+    support before Python 3.14, so the command is sent on the raw
+    connection: IDLE is ended with DONE when the server reports a new
+    message or the timeout expires.
+
+    Args:
+        mail: Connected IMAP session with the inbox selected
+        timeout: Maximum seconds to wait
+
+    Returns:
+        True if the server reported new messages, False on timeout
+
+    Raises:
+        imaplib.IMAP4.abort: If the connection was lost
+        imaplib.IMAP4.error: If the server rejected IDLE
+    """
+    tag = mail._new_tag()
+    mail.tagged_commands.pop(tag, None)
+    mail.send(tag + b' IDLE\r\n')
+    line = mail.readline()
+    if not line.startswith(b'+'):
+        raise imaplib.IMAP4.error(f"IDLE rejected: {line.strip()!r}")
+
+    new_mail = False
+    deadline = time.monotonic() + timeout
+    previous_timeout = mail.sock.gettimeout()
+    try:
+        while not new_mail:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # A socket timeout rather than select(), which cannot see lines
+            # already read ahead into imaplib's buffered reader
+            mail.sock.settimeout(remaining)
+            try:
+                line = mail.readline()
+            except socket.timeout:
+                # A socket file refuses all reads after a timeout, so replace it
+                mail.file = mail.sock.makefile('rb')
+                break
+            if not line or line.startswith(b'* BYE'):
+                raise imaplib.IMAP4.abort(f"Connection closed during IDLE: {line.strip()!r}")
+            new_mail = bool(NEW_MAIL_PATTERN.match(line))
+    finally:
+        mail.sock.settimeout(previous_timeout)
+
+    mail.send(b'DONE\r\n')
+    while True:
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("Connection closed while ending IDLE")
+        if line.startswith(tag):
+            if not line[len(tag):].strip().upper().startswith(b'OK'):
+                raise imaplib.IMAP4.error(f"IDLE failed: {line.strip()!r}")
+            return new_mail
+        new_mail = new_mail or bool(NEW_MAIL_PATTERN.match(line))
+
+
+def watch_inbox(config: Config, on_download: Callable[[Dict[str, int]], None],
+                stop_event: Optional[threading.Event] = None,
+                on_saved: Optional[Callable[[Path], None]] = None) -> None:
+    """
+    Keep downloading scanned emails as they arrive, until stop_event is set.
+
+    After every download the session waits in IMAP IDLE (or polls with
+    NOOP if the server lacks IDLE). IDLE is renewed every
+    IDLE_REFRESH_SECONDS, which also keeps the connection alive, and the
+    inbox is searched again each time. Lost connections are re-established
+    with exponential backoff.
+
+    Args:
+        config: Configuration object with email credentials
+        on_download: Called with the attachment count per category after
+            every download that saved at least one attachment
+        stop_event: Set to stop watching (checked between waits)
+        on_saved: Called with the path of every saved attachment
+
+    Raises:
+        ValueError: If the email configuration is incomplete
+    """
+    username, password, server = get_email_credentials(config)
+    storage_dirs = create_storage_dirs()
+    stop_event = stop_event or threading.Event()
+    reconnect_delay = RECONNECT_DELAY
+
+    while not stop_event.is_set():
+        mail = None
+        try:
+            mail = connect(username, password, server)
+            supports_idle = 'IDLE' in mail.capabilities
+            logger.info(f"Watching inbox of {username} "
+                        f"({'IDLE' if supports_idle else f'polling every {POLL_INTERVAL}s'})")
+            reconnect_delay = RECONNECT_DELAY
+            while not stop_event.is_set():
+                download_counts = download_new_scanned_emails(mail, EMAIL_SUBJECTS, storage_dirs,
+                                                              on_saved=on_saved)
+                if sum(download_counts.values()) > 0:
+                    on_download(download_counts)
+                if supports_idle:
+                    idle_wait(mail, IDLE_REFRESH_SECONDS)
+                else:
+                    stop_event.wait(POLL_INTERVAL)
+                    mail.noop()
+        except (imaplib.IMAP4.error, OSError) as e:
+            logger.warning(f"IMAP connection lost: {e}, reconnecting in {reconnect_delay:.0f}s")
+            stop_event.wait(reconnect_delay)
+            reconnect_delay = min(MAX_RECONNECT_DELAY, reconnect_delay * 2)
+        except Exception as e:
+            # E.g. a malformed server response; the session state is unknown, so start over
+            logger.error(f"Unexpected error while watching inbox: {e}, reconnecting in {reconnect_delay:.0f}s")
+            stop_event.wait(reconnect_delay)
+            reconnect_delay = min(MAX_RECONNECT_DELAY, reconnect_delay * 2)
+        finally:
+            if mail:
+                logout(mail)
+
+
 def main() -> None:
     """Main execution function for testing."""
     try:
         config = Config('secrets.json')
-        ablegen, steuern, business = init_and_download(config)
-        logger.info(f"Successfully downloaded files: Ablegen={ablegen}, Steuern={steuern}, Business={business}")
+        ablegen, steuern, business, rezepte = init_and_download(config)
+        logger.info(f"Successfully downloaded files: Ablegen={ablegen}, Steuern={steuern}, "
+                    f"Business={business}, Rezepte={rezepte}")
     except Exception as e:
         logger.error(f"Email download failed: {e}")
         raise
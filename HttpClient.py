@@ -0,0 +1,101 @@
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = 10  # Keep-alive connections per host
+CONNECT_TIMEOUT = 10  # Seconds
+READ_TIMEOUT = 120  # Seconds
+RETRIES = 3
+RETRY_BACKOFF = 0.5  # Seconds, doubled after every retry
+RETRY_STATUSES = (500, 502, 503, 504)
+
+_sessions: Dict[bool, requests.Session] = {}
+_session_lock = threading.Lock()
+
+
+def create_session(pool_size: int = POOL_SIZE, retries: int = RETRIES,
+                   backoff_factor: float = RETRY_BACKOFF, retry_status: bool = True) -> requests.Session:
+    """
+    Create a session with keep-alive connection pooling and HTTP-level retries.
+
+    Connection errors are retried with exponential backoff. RETRY_STATUSES
+    responses are retried only for idempotent methods: a gateway error to a
+    POST may arrive after the server already acted on it (e.g. a completed
+    upload). For the same reason requests are not resent after a read error.
+
+    Args:
+        pool_size: Maximum number of pooled connections per host
+        retries: Maximum number of retries per request
+        backoff_factor: Base delay in seconds between retries
+        retry_status: If False, RETRY_STATUSES responses are returned to
+            the caller instead of being retried (for callers with their
+            own backoff, e.g. RateLimiter)
+
+    Returns:
+        Configured requests.Session
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=retries if retry_status else 0,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES if retry_status else None,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session(retry_status: bool = True) -> requests.Session:
+    """
+    Return the process-wide shared session, creating it on first use.
+
+    Args:
+        retry_status: Whether the session retries RETRY_STATUSES responses
+            (see create_session); each variant has its own connection pool
+
+    Returns:
+        The shared requests.Session
+    """
+    with _session_lock:
+        if retry_status not in _sessions:
+            _sessions[retry_status] = create_session(retry_status=retry_status)
+            logger.debug(f"Created HTTP session (pool size {POOL_SIZE}, status retries {retry_status})")
+        return _sessions[retry_status]
+
+
+def post(url: str, timeout: Optional[Tuple[float, float]] = None, retry_status: bool = True,
+         **kwargs) -> requests.Response:
+    """
+    Send a POST request over the shared session.
+
+    Args:
+        url: Request URL
+        timeout: (connect, read) timeout in seconds, defaults to
+            (CONNECT_TIMEOUT, READ_TIMEOUT)
+        retry_status: Selects the session (see get_session); POST itself is
+            only retried on connection errors, never on a server error status
+        **kwargs: Further arguments passed to requests.Session.post
+
+    Returns:
+        The response
+    """
+    if timeout is None:
+        timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+    return get_session(retry_status).post(url=url, timeout=timeout, **kwargs)
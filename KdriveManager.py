@@ -4,6 +4,7 @@ from typing import Optional
 
 import requests
 
+import HttpClient
 from ConfigReader import Config
 
 # Configure logging
@@ -96,7 +97,8 @@ def upload_file(
     # Make upload request
     try:
         logger.debug(f"Uploading {original_filename} as {new_filename} to directory '{directory}'")
-        response = requests.post(url=api_url, data=data, headers=headers)
+        # No status retries: a 502/504 may come back after kDrive stored the file
+        response = HttpClient.post(url=api_url, data=data, headers=headers, retry_status=False)
         response.raise_for_status()
 
         result = response.json()
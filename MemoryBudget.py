@@ -0,0 +1,72 @@
+import logging
+import threading
+from typing import Dict
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class MemoryBudget:
+    """
+    Process-wide byte budget shared by all threads, i.e. a semaphore
+    counted in bytes.
+
+    Work that allocates large buffers acquires its estimated size first and
+    blocks while the budget is exhausted, so the sum of all reservations
+    never exceeds the capacity, however many threads run at once. A single
+    reservation larger than the capacity is clamped to it, so it waits
+    until the budget is empty instead of blocking forever.
+    """
+
+    def __init__(self, capacity: int):
+        """
+        Args:
+            capacity: Budget in bytes
+        """
+        self.capacity = capacity
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._peak = 0
+
+    def acquire(self, amount: int) -> int:
+        """
+        Block until amount bytes are available and reserve them.
+
+        Args:
+            amount: Bytes to reserve
+
+        Returns:
+            Bytes actually reserved; pass this value to release
+        """
+        amount = max(0, min(amount, self.capacity))
+        with self._cond:
+            while self._in_use + amount > self.capacity:
+                self._cond.wait()
+            self._in_use += amount
+            self._peak = max(self._peak, self._in_use)
+        return amount
+
+    def release(self, amount: int) -> None:
+        """
+        Return reserved bytes to the budget.
+
+        Args:
+            amount: Value returned by acquire
+        """
+        with self._cond:
+            self._in_use -= amount
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the current and peak reserved bytes.
+
+        Returns:
+            Dictionary with in_use, peak and capacity in bytes
+        """
+        with self._cond:
+            return {'in_use': self._in_use, 'peak': self._peak, 'capacity': self.capacity}
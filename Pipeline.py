@@ -0,0 +1,147 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 4  # Items waiting in front of each stage before producers block
+
+# Stage function: (item, emit) -> None, calling emit for every item passed on to the next stage
+StageFunction = Callable[[Any, Callable[[Any], None]], None]
+
+_STOP = object()  # Queue sentinel telling a worker to exit
+
+
+class Pipeline:
+    """
+    Chain of processing stages connected by bounded queues.
+
+    Every stage has its own worker threads and input queue. A stage
+    function receives an item and calls emit for each item it passes on
+    (none to drop it, several to fan out); emit blocks while the next
+    queue is full, so a slow stage throttles the stages in front of it
+    instead of letting work pile up in memory. Throughput is limited by
+    the slowest stage rather than by the sum of all stages.
+    """
+
+    def __init__(self, stages: List[Tuple[str, StageFunction, int]], queue_size: int = QUEUE_SIZE,
+                 on_error: Optional[Callable[[Any, Exception], None]] = None):
+        """
+        Args:
+            stages: (name, function, worker count) per stage, in order
+            queue_size: Capacity of the queue in front of each stage
+            on_error: Called with the item and exception when a stage
+                function raises; the item is dropped (default: log the error)
+        """
+        self.names = [name for name, _, _ in stages]
+        self._functions = [function for _, function, _ in stages]
+        self._workers = [max(1, workers) for _, _, workers in stages]
+        self._on_error = on_error
+        self._queues: List[queue.Queue] = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._running = [0] * len(stages)
+        self._stats: List[Dict[str, float]] = [
+            {'processed': 0, 'failed': 0, 'busy_seconds': 0.0, 'max_queue': 0} for _ in stages
+        ]
+
+    def start(self) -> None:
+        """Start the worker threads of all stages."""
+        for index, workers in enumerate(self._workers):
+            self._running[index] = workers
+            for number in range(workers):
+                thread = threading.Thread(target=self._work, args=(index,),
+                                          name=f"{self.names[index]}-{number + 1}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, item: Any) -> None:
+        """
+        Feed an item to the first stage, blocking while its queue is full.
+
+        Args:
+            item: Input of the first stage
+        """
+        self._put(0, item)
+
+    def close(self) -> None:
+        """Let all submitted items run through the pipeline and stop the workers."""
+        for _ in range(self._workers[0]):
+            self._queues[0].put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Return the counters of every stage.
+
+        Returns:
+            Dictionary of stage name to processed, failed, busy_seconds
+            (summed over workers) and max_queue (highest queue depth seen)
+        """
+        with self._lock:
+            return {name: dict(stats) for name, stats in zip(self.names, self._stats)}
+
+    def _put(self, index: int, item: Any) -> None:
+        self._queues[index].put(item)
+        with self._lock:
+            stats = self._stats[index]
+            stats['max_queue'] = max(stats['max_queue'], self._queues[index].qsize())
+
+    def _work(self, index: int) -> None:
+        function = self._functions[index]
+        is_last = index == len(self._functions) - 1
+
+        def emit(next_item: Any) -> None:
+            if not is_last:
+                self._put(index + 1, next_item)
+
+        while True:
+            item = self._queues[index].get()
+            if item is _STOP:
+                break
+            start = time.time()
+            failed = False
+            try:
+                function(item, emit)
+            except Exception as e:
+                failed = True
+                if self._on_error is not None:
+                    self._on_error(item, e)
+                else:
+                    logger.error(f"Pipeline stage {self.names[index]} failed on {item}: {e}")
+            with self._lock:
+                stats = self._stats[index]
+                stats['processed'] += 1
+                stats['failed'] += 1 if failed else 0
+                stats['busy_seconds'] += time.time() - start
+
+        # The last worker of a stage to finish stops the next stage
+        with self._lock:
+            self._running[index] -= 1
+            last_worker = self._running[index] == 0
+        if last_worker and not is_last:
+            for _ in range(self._workers[index + 1]):
+                self._queues[index + 1].put(_STOP)
+
+
+def format_stats(stats: Dict[str, Dict[str, float]]) -> List[str]:
+    """
+    Format pipeline stage counters for logging, one line per stage.
+
+    Args:
+        stats: Result of Pipeline.stats
+
+    Returns:
+        Human-readable lines
+    """
+    return [f"{name}: {s['processed']} items, {s['failed']} failed, busy {s['busy_seconds']:.0f}s, "
+            f"max queue {s['max_queue']}" for name, s in stats.items()]
+
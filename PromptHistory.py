@@ -0,0 +1,126 @@
+import json
+import logging
+import random
+import threading
+from pathlib import Path
+from typing import Dict, List
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_LATENCY = 5.0  # Seconds assumed for a template that was never tried
+
+
+class PromptHistory:
+    """
+    Success rate and latency of every prompt template, persisted across runs.
+
+    Templates are ordered bandit-style: for each template a success
+    probability is drawn from its Beta posterior (Thompson sampling) and the
+    templates are sorted by expected cost to success, i.e. mean latency
+    divided by that probability. Templates with little history keep being
+    explored, while ones that keep producing rejected answers move back.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._data: Dict[str, List[Dict[str, float]]] = {}
+        self._loaded = False
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable prompt history {self.path}: {e}")
+            self._data = {}
+
+    def _entries(self, kind: str, template_count: int) -> List[Dict[str, float]]:
+        entries = self._data.setdefault(kind, [])
+        while len(entries) < template_count:
+            entries.append({'attempts': 0, 'successes': 0, 'latency': 0.0})
+        return entries
+
+    def record(self, kind: str, idx: int, success: bool, latency: float) -> None:
+        """
+        Record one LLM request made with a prompt template.
+
+        Args:
+            kind: Prompt family ('name', 'category' or 'recipe')
+            idx: Index of the prompt template
+            success: True if the response was usable
+            latency: Request duration in seconds
+        """
+        with self._lock:
+            self._load()
+            entry = self._entries(kind, idx + 1)[idx]
+            entry['attempts'] += 1
+            entry['successes'] += 1 if success else 0
+            entry['latency'] += latency
+
+    def order(self, kind: str, template_count: int) -> List[int]:
+        """
+        Return template indices sorted by sampled expected cost to success.
+
+        Args:
+            kind: Prompt family ('name', 'category' or 'recipe')
+            template_count: Number of prompt templates
+
+        Returns:
+            Template indices, cheapest first
+        """
+        with self._lock:
+            self._load()
+            entries = self._entries(kind, template_count)[:template_count]
+            costs = []
+            for idx, entry in enumerate(entries):
+                attempts = entry['attempts']
+                failures = attempts - entry['successes']
+                success_prob = random.betavariate(entry['successes'] + 1, failures + 1)
+                mean_latency = entry['latency'] / attempts if attempts else DEFAULT_LATENCY
+                costs.append((mean_latency / max(success_prob, 1e-6), idx))
+        return [idx for _, idx in sorted(costs)]
+
+    def summary(self, kind: str) -> str:
+        """
+        Format the success rate and mean latency per template for logging.
+
+        Args:
+            kind: Prompt family ('name', 'category' or 'recipe')
+
+        Returns:
+            Human-readable summary
+        """
+        with self._lock:
+            self._load()
+            parts = []
+            for entry in self._data.get(kind, []):
+                attempts = entry['attempts']
+                if attempts:
+                    parts.append(f"{entry['successes']}/{attempts} ok, "
+                                 f"{entry['latency'] / attempts:.1f}s")
+                else:
+                    parts.append("untried")
+        return "; ".join(parts)
+
+    def save(self) -> None:
+        """Write the history to disk."""
+        with self._lock:
+            if not self._loaded:
+                return
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, 'w', encoding='utf-8') as f:
+                    json.dump(self._data, f)
+            except OSError as e:
+                logger.warning(f"Failed to save prompt history: {e}")
@@ -0,0 +1,168 @@
+import datetime
+import email.utils
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DECREASE_FACTOR = 0.5  # Concurrency and rate are multiplied by this on a throttle or server error
+LATENCY_DECREASE_FACTOR = 0.9  # Concurrency is multiplied by this on a response slower than the target
+BASE_BACKOFF = 1.0  # Seconds of pause after a throttle without Retry-After, doubled per repeat
+MAX_BACKOFF = 60.0  # Seconds
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header value.
+
+    Args:
+        value: Header value, either delay seconds or an HTTP date
+
+    Returns:
+        Seconds to wait, or None if the header is missing or malformed
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+class RateLimiter:
+    """
+    Client-side limiter for a rate-limited API, shared by all threads.
+
+    Requests need a token from a token bucket (request rate) and a free
+    slot below the concurrency limit. Both limits adapt AIMD-style:
+    every successful response raises them additively, a throttled (429) or
+    failed (5xx) response halves them and pauses all requests for the
+    Retry-After delay or an exponential backoff. Responses slower than the
+    latency target shrink the concurrency limit slightly.
+    """
+
+    def __init__(self, max_rate: float, burst: int, max_concurrency: int,
+                 min_concurrency: int = 1, latency_target: Optional[float] = None):
+        """
+        Args:
+            max_rate: Maximum requests per second
+            burst: Token bucket capacity
+            max_concurrency: Upper bound of the adaptive concurrency limit
+            min_concurrency: Lower bound of the adaptive concurrency limit
+            latency_target: Seconds; slower responses reduce concurrency (None = off)
+        """
+        self.max_rate = max_rate
+        self.min_rate = max_rate / 10
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.latency_target = latency_target
+
+        self._cond = threading.Condition()
+        self._rate = max_rate
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._consecutive_failures = 0
+
+        self._waiting = 0
+        self._max_waiting = 0
+        self._throttled = 0
+        self._errors = 0
+        self._wait_seconds = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+
+    def acquire(self) -> None:
+        """Block until a request may be sent. Every acquire must be followed by a release."""
+        start = time.monotonic()
+        with self._cond:
+            self._waiting += 1
+            self._max_waiting = max(self._max_waiting, self._waiting)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if now < self._paused_until:
+                        self._cond.wait(self._paused_until - now)
+                    elif self._in_flight >= int(self._limit):
+                        self._cond.wait()
+                    elif self._tokens < 1:
+                        self._cond.wait((1 - self._tokens) / self._rate)
+                    else:
+                        break
+                self._tokens -= 1
+                self._in_flight += 1
+            finally:
+                self._waiting -= 1
+            self._wait_seconds += time.monotonic() - start
+
+    def release(self, outcome: str, latency: float, retry_after: Optional[float] = None) -> None:
+        """
+        Finish a request and adapt the limits to its outcome.
+
+        Args:
+            outcome: 'ok', 'throttled' (HTTP 429) or 'error' (server error or no response)
+            latency: Request duration in seconds
+            retry_after: Delay requested by the server, if any
+        """
+        with self._cond:
+            self._in_flight -= 1
+            if outcome == 'ok':
+                self._consecutive_failures = 0
+                self._rate = min(self.max_rate, self._rate + self.max_rate / 10)
+                if self.latency_target is not None and latency > self.latency_target:
+                    self._limit = max(self.min_concurrency, self._limit * LATENCY_DECREASE_FACTOR)
+                else:
+                    self._limit = min(self.max_concurrency, self._limit + 1 / self._limit)
+            else:
+                if outcome == 'throttled':
+                    self._throttled += 1
+                else:
+                    self._errors += 1
+                self._consecutive_failures += 1
+                self._rate = max(self.min_rate, self._rate * DECREASE_FACTOR)
+                self._limit = max(self.min_concurrency, self._limit * DECREASE_FACTOR)
+                if retry_after is None:
+                    retry_after = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (self._consecutive_failures - 1))
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                logger.warning(f"API {outcome}, pausing requests for {retry_after:.1f}s "
+                               f"(concurrency limit {int(self._limit)}, {self._rate:.2f} req/s)")
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Return a snapshot of the limiter state and counters.
+
+        Returns:
+            Dictionary with queue_depth, max_queue_depth, in_flight,
+            concurrency_limit, rate, throttled, errors and wait_seconds
+        """
+        with self._cond:
+            return {
+                'queue_depth': self._waiting,
+                'max_queue_depth': self._max_waiting,
+                'in_flight': self._in_flight,
+                'concurrency_limit': int(self._limit),
+                'rate': self._rate,
+                'throttled': self._throttled,
+                'errors': self._errors,
+                'wait_seconds': self._wait_seconds,
+            }
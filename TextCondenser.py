@@ -0,0 +1,157 @@
+import logging
+import math
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4  # Rough average for German and English text
+MIN_LINE_CHARS = 3  # Shorter lines are dropped as noise
+MIN_ALNUM_RATIO = 0.5  # Lines with fewer letters/digits than this share are OCR noise
+HEADER_LINES = 12  # Lines at the top of the first page that get a position bonus
+
+DATE_PATTERN = re.compile(
+    r'\b\d{1,2}[./-]\s?\d{1,2}[./-]\s?\d{2,4}\b'
+    r'|\b\d{4}-\d{2}-\d{2}\b'
+    r'|\b\d{1,2}\.?\s+(?:jan|feb|mär|mar|apr|mai|may|jun|jul|aug|sep|okt|oct|nov|dez|dec)[a-zä]*\.?\s+\d{4}\b',
+    re.IGNORECASE
+)
+AMOUNT_PATTERN = re.compile(
+    r'(?:chf|eur|usd|fr\.|sfr|€|\$)\s?-?\d[\d\'’ .,]*'
+    r'|\b\d[\d\'’]*[.,]\d{2}\s?(?:chf|eur|usd|fr\.|€)'
+    r'|\btotal\b|\bbetrag\b|\bsumme\b',
+    re.IGNORECASE
+)
+SUBJECT_PATTERN = re.compile(
+    r'^(?:betreff|betrifft|subject|objet|re|ihre?\s+\w+)\s*:'
+    r'|\b(?:rechnung|mahnung|kontoauszug|vertrag|police|offerte|bestätigung|kündigung'
+    r'|abrechnung|verfügung|lohnausweis|quittung|invoice|statement)\b',
+    re.IGNORECASE
+)
+ADDRESS_PATTERN = re.compile(
+    r'\b(?:ch-|d-|a-)?\d{4,5}\s+[A-ZÄÖÜ][a-zäöüé]+'
+    r'|\b(?:herr|frau|familie|postfach|ag|gmbh|sa)\b'
+    r'|\b[\w.-]+@[\w-]+\.\w+|www\.\S+',
+    re.IGNORECASE
+)
+FOOTER_PATTERN = re.compile(
+    r'^(?:seite|page|blatt)\s*\d+\s*(?:/|von|of)\s*\d+$|^-?\s*\d+\s*-?$',
+    re.IGNORECASE
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of LLM tokens of a text.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Approximate token count (characters / CHARS_PER_TOKEN)
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _normalize(line: str) -> str:
+    """Reduce a line to a form that matches repeated headers with changing numbers."""
+    return re.sub(r'\d+', '#', line.lower())
+
+
+def _is_noise(line: str) -> bool:
+    if len(line) < MIN_LINE_CHARS or FOOTER_PATTERN.match(line):
+        return True
+    alnum = sum(1 for c in line if c.isalnum())
+    if alnum / len(line) < MIN_ALNUM_RATIO:
+        return True
+    # OCR garbage: no word of at least 2 letters and no number
+    return not re.search(r'[^\W\d_]{2,}|\d{2,}', line)
+
+
+def _score_line(line: str, page_num: int, line_num: int, keep_terms: List[str]) -> float:
+    score = 1.0
+    if DATE_PATTERN.search(line):
+        score += 3
+    if AMOUNT_PATTERN.search(line):
+        score += 3
+    if SUBJECT_PATTERN.search(line):
+        score += 3
+    if ADDRESS_PATTERN.search(line):
+        score += 2
+    lowered = line.lower()
+    if any(term.lower() in lowered for term in keep_terms):
+        score += 3
+    if page_num == 0 and line_num < HEADER_LINES:
+        # Sender block and subject sit at the top of the first page
+        score += 2 * (1 - line_num / HEADER_LINES)
+    # Later pages rarely change the name or category of a document
+    return score / (1 + 0.5 * page_num)
+
+
+def condense(page_texts: List[str], token_budget: int,
+             keep_terms: Optional[List[str]] = None) -> str:
+    """
+    Reduce OCR page texts to their most informative lines within a token budget.
+
+    Noise lines (OCR garbage, page numbers) are dropped and lines repeated
+    across pages (letterheads, footers) are kept only once. The remaining
+    lines are ranked, favouring dates, amounts, subject lines, sender and
+    address blocks, lines containing keep_terms and the top of the first
+    page. The best lines that fit the budget are returned in document order.
+
+    Args:
+        page_texts: Text per page, with lines separated by newlines
+        token_budget: Maximum estimated tokens of the result
+        keep_terms: Words that make a line more important (e.g. person names)
+
+    Returns:
+        Condensed text with lines separated by spaces
+    """
+    keep_terms = keep_terms or []
+    budget_chars = token_budget * CHARS_PER_TOKEN
+
+    # Count on how many pages each (normalized) line occurs
+    page_counts: Dict[str, int] = {}
+    pages_lines = []
+    for text in page_texts:
+        lines = [' '.join(line.split()) for line in text.splitlines()]
+        lines = [line for line in lines if line]
+        pages_lines.append(lines)
+        for key in {_normalize(line) for line in lines}:
+            page_counts[key] = page_counts.get(key, 0) + 1
+
+    candidates: List[Tuple[float, int, str]] = []
+    seen = set()
+    dropped = 0
+    for page_num, lines in enumerate(pages_lines):
+        for line_num, line in enumerate(lines):
+            key = _normalize(line)
+            if key in seen or _is_noise(line):
+                dropped += 1
+                continue
+            seen.add(key)
+            score = _score_line(line, page_num, line_num, keep_terms)
+            if page_counts[key] > 1 and not (page_num == 0 and line_num < HEADER_LINES):
+                # Running footer: keep its first occurrence, but rank it low. A repeated
+                # letterhead at the top of the first page usually names the sender.
+                score *= 0.5
+            # A line longer than the whole budget (unstructured text) is cut rather than lost
+            candidates.append((score, len(candidates), line[:budget_chars - 1]))
+
+    selected = []
+    used_chars = 0
+    for score, position, line in sorted(candidates, key=lambda c: (-c[0], c[1])):
+        if used_chars + len(line) + 1 > budget_chars:
+            continue
+        selected.append((position, line))
+        used_chars += len(line) + 1
+
+    result = ' '.join(line for _, line in sorted(selected))
+    logger.debug(f"Condensed {sum(len(t) for t in page_texts)} to {len(result)} characters "
+                 f"({len(selected)}/{len(candidates)} lines kept, {dropped} noise/duplicate lines dropped)")
+    return result
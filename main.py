@@ -1,13 +1,20 @@
+import abc
 import datetime
+import functools
+import io
 import json
 import logging
+import math
 import os
 import random
 import re
 import shutil
+import subprocess
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import Any, Callable, Iterator, List, Dict, Optional, Tuple, TypeVar
 
 import pytesseract
 import requests
@@ -15,8 +22,21 @@ from pdf2image import convert_from_path
 from PIL import Image
 from pypdf import PdfReader, PdfWriter
 
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+import CacheManager
+import CategoryClassifier
 import EmailManager
+import HttpClient
 import KdriveManager
+import MemoryBudget
+import Pipeline
+import PromptHistory
+import RateLimiter
+import TextCondenser
 from ConfigReader import Config
 
 # Configure logging
@@ -26,6 +46,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+R = TypeVar('R')
+T = TypeVar('T')
+
 MIN_LENGTH = 15
 PATTERN = r'["\']?\s*([^"\'>\s]*\.pdf)\s*["\']?'
 RETRIES = 3
@@ -44,17 +67,108 @@ REJECTED_NAMES = [
     'zuercher_geschnetzeltes_klassisch',
     'overnight_oats_beeren_gesund',
 ]
+OCR_BACKEND = 'tesserocr'  # 'tesserocr' (resident engine) or 'pytesseract' (one process per call)
+OCR_DPI = 500
+OCR_LANGUAGE = 'eng'  # Tesseract language(s), e.g. 'deu+eng'
+OCR_WORKERS = os.cpu_count() or 1  # Worker processes for parallel per-page OCR
+RASTER_WINDOW = 2  # Pages rasterized together in serial OCR mode
+MAX_RASTER_MEMORY_MB = 1024  # Cap on estimated page raster memory, shared by all documents being OCRed
+RASTER_WORKING_SET_FACTOR = 2.5  # Page bitmap plus its rotated, grayscale and binarized copies during OCR
+THUMBNAIL_DPI = 150  # Resolution used for orientation detection and page analysis
+OSD_MIN_CONFIDENCE = 2.0  # Below this, fall back to OCRing all 4 rotations
+OCR_MIN_DPI = 200  # Lowest resolution pages are downscaled to before OCR
+OCR_TARGET_LINE_HEIGHT_PX = 32  # Text line height Tesseract should see after downscaling
+OCR_RETRY_MIN_SCORE = 150  # Below this score_ocr_text, retry OCR at full resolution
+DESKEW_MAX_ANGLE = 5.0  # Largest skew (degrees) corrected during preprocessing
+DESKEW_STEP = 0.5
+OCR_TEXT_BUDGET = 6000  # Characters OCRed before the remaining pages are skipped
+LLM_TOKEN_BUDGET = 500  # Approximate tokens of condensed document text sent to the LLM
+OCR_PROFILE = 'full'  # 'full' or 'fast' (OCR the first page header region first)
+HEADER_REGION_FRACTION = 0.35  # Top part of the first page OCRed by the 'fast' profile
+HEADER_MIN_CHARS = 80  # Shorter header text goes straight to full-page OCR
+TEXT_LAYER_MIN_SCORE = 100  # Minimum score_ocr_text per page to use an embedded text layer instead of OCR
+OCR_CACHE_DIR = 'Cache/ocr'
+OCR_CACHE_MAX_MB = 200
+OCR_CACHE_MAX_AGE_DAYS = 30
+LLM_MODEL = "qwen3"
+COMBINED_PROMPT = True  # Ask for name and category in one JSON request first
+COMBINED_MIN_CONFIDENCE = 0.7  # Below this, the combined category answer is not trusted
+# Category samples in flight at once (1 = sequential voting). The vote ends with the first parseable
+# answer, so extra samples only save time when answers are often unparseable, at the cost of quota
+CATEGORY_PARALLEL_VOTES = 1
+NAME_MAX_IN_FLIGHT = 3  # Speculative filename requests in flight at once (1 = sequential)
+PRECLASSIFIER_ENABLED = True
+PRECLASSIFIER_MIN_CONFIDENCE = 0.8  # Local classifier confidence needed to skip the LLM vote
+PRECLASSIFIER_AUDIT_RATE = 0.1  # Share of confident predictions still checked by the LLM
+CLASSIFIER_HISTORY_PATH = 'Cache/classifier_history.json'
+ADAPTIVE_PROMPT_ORDER = True  # Try the template with the best expected cost to success first
+PROMPT_HISTORY_PATH = 'Cache/prompt_history.json'
+LLM_RATE_LIMIT = 1.0  # Maximum LLM requests per second
+LLM_BURST = 3  # LLM requests that may be sent back to back
+LLM_MAX_CONCURRENCY = 6  # Upper bound of the adaptive number of LLM requests in flight
+LLM_LATENCY_TARGET = 30.0  # Seconds; slower LLM responses reduce concurrency
+LLM_MAX_ATTEMPTS = 4  # Tries per LLM request when throttled (429) or on server errors
+LLM_RETRY_STATUSES = (429, 500, 502, 503, 504)
+PIPELINE_OCR_WORKERS = 2  # Documents OCRed at once (their pages share the OCR process pool)
+PIPELINE_LLM_WORKERS = 4  # Documents named at once (requests are throttled by llm_limiter)
+PIPELINE_UPLOAD_WORKERS = 2  # Documents uploaded and archived at once
+PIPELINE_QUEUE_SIZE = 4  # Documents waiting in front of each stage
+LLM_CACHE_ENABLED = True
+LLM_CACHE_DIR = 'Cache/llm'
+LLM_CACHE_MAX_MB = 50
+LLM_CACHE_TTL_DAYS = 7
+
+# Shared OCR process pool, created lazily by _get_ocr_pool
+_ocr_pool: Optional[ProcessPoolExecutor] = None
+_ocr_pool_size = 0
+_ocr_pool_lock = threading.Lock()  # Documents are OCRed from several pipeline threads
+
+# Raster memory reserved by every page being rasterized and OCRed, across all documents
+raster_budget = MemoryBudget.MemoryBudget(MAX_RASTER_MEMORY_MB * 1024 * 1024)
+
+# Per-thread OCR engine, created lazily by get_ocr_engine
+_ocr_engine_local = threading.local()
+
+# OCR results keyed by PDF content hash and OCR settings
+ocr_cache = CacheManager.DiskCache(OCR_CACHE_DIR, OCR_CACHE_MAX_MB * 1024 * 1024,
+                                   OCR_CACHE_MAX_AGE_DAYS * 24 * 3600)
+
+# Success rate and latency per prompt template, kept across runs
+prompt_history = PromptHistory.PromptHistory(PROMPT_HISTORY_PATH)
+
+# Shared by all LLM callers to stay within the AI product quota
+llm_limiter = RateLimiter.RateLimiter(LLM_RATE_LIMIT, LLM_BURST, LLM_MAX_CONCURRENCY,
+                                      latency_target=LLM_LATENCY_TARGET)
+
+# LLM responses keyed by model and prompt
+llm_cache = CacheManager.DiskCache(LLM_CACHE_DIR, LLM_CACHE_MAX_MB * 1024 * 1024,
+                                   LLM_CACHE_TTL_DAYS * 24 * 3600)
 
 # Statistics for prompt effectiveness
 prompt_stats = {
     'name': [0, 0, 0],  # One counter per prompt template in get_document_name
     'category': [0, 0, 0],  # One counter per prompt template in get_document_category
     'recipe': [0, 0, 0],  # One counter per prompt template in get_recipe_name
+    'combined': [0, 0],  # Fields accepted from get_document_info: [name, category]
 }
 
+# Guards prompt_stats and run_stats against concurrent updates
+_stats_lock = threading.Lock()
+
 # Run statistics
 run_stats = {
     'rotated': 0,
+    'text_layer': 0,
+    'ocr': 0,
+    'header_ocr': 0,
+    'ocr_cache_hits': 0,
+    'llm_cache_hits': 0,
+    'preclassifier_checked': 0,
+    'preclassified': 0,
+    'preclassifier_compared': 0,
+    'preclassifier_agreed': 0,
+    'raw_tokens': 0,  # Estimated tokens of extracted document text
+    'prompt_tokens': 0,  # Estimated tokens of it left after condensing
     'split': 0,
     'split_pages_total': 0,
     'uploaded': 0,
@@ -62,6 +176,31 @@ run_stats = {
 }
 
 
+def count_run_stat(key: str, amount: int = 1) -> None:
+    """
+    Increment a run_stats counter. Safe to call from concurrent threads.
+
+    Args:
+        key: Counter name in run_stats
+        amount: Value to add
+    """
+    with _stats_lock:
+        run_stats[key] += amount
+
+
+def record_prompt_success(kind: str, idx: int) -> None:
+    """
+    Count a successful prompt template in prompt_stats. Safe to call from
+    concurrent threads.
+
+    Args:
+        kind: 'name', 'category' or 'recipe'
+        idx: Index of the prompt template that succeeded
+    """
+    with _stats_lock:
+        prompt_stats[kind][idx] += 1
+
+
 def list_files(directory: str) -> List[str]:
     """List all files in a directory."""
     return os.listdir(directory)
@@ -78,70 +217,823 @@ def score_ocr_text(text: str) -> float:
     return alpha_count
 
 
-def ocr_file(pdf_path: str, auto_rotate: bool = True) -> Tuple[str, bool]:
+def run_tesseract(image: Image.Image, *args: str) -> str:
     """
-    Extract text from a PDF file using OCR.
-    Optionally tries all 4 rotations (0, 90, 180, 270) per page and picks
-    the one with the best OCR result. The PDF file is then overwritten with
-    the correctly rotated pages.
+    Run the tesseract binary on an in-memory image. The image is piped to
+    tesseract as an uncompressed PNM buffer and the result is read from
+    stdout, so nothing is written to disk and no lossy re-encoding happens.
 
     Args:
-        pdf_path: Path to the PDF file to process
-        auto_rotate: If True, try all 4 rotations per page and pick the best
+        image: PIL image to process
+        *args: Extra tesseract command line arguments (e.g. '--psm', '0')
 
     Returns:
-        Tuple of (extracted text with newlines replaced by spaces, was_rotated)
+        Tesseract output as text
+
+    Raises:
+        pytesseract.TesseractError: If tesseract exits with an error
     """
-    temp_dir = Path('Temp')
-    temp_dir.mkdir(exist_ok=True)
+    if image.mode not in ('1', 'L', 'RGB'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format='PPM')
 
-    pdf_file = Path(pdf_path)
-    pdf_pages = convert_from_path(pdf_file, 500)
+    cmd = [pytesseract.pytesseract.tesseract_cmd, 'stdin', 'stdout', *args]
+    result = subprocess.run(cmd, input=buffer.getvalue(), capture_output=True)
+    if result.returncode != 0:
+        raise pytesseract.TesseractError(result.returncode,
+                                         result.stderr.decode('utf-8', errors='ignore').strip())
+    return result.stdout.decode('utf-8', errors='ignore')
 
-    output_text = ""
-    best_rotations = []
 
-    for page_num, page_img in enumerate(pdf_pages, start=1):
-        best_text = ""
-        best_score = 0.0
-        best_rotation = 0
+def _parse_osd(osd: str) -> Optional[Tuple[int, float]]:
+    """
+    Parse the rotation and confidence from tesseract OSD output.
+
+    Args:
+        osd: Output of tesseract --psm 0
+
+    Returns:
+        Tuple of (clockwise rotation in degrees, orientation confidence),
+        or None if the output could not be parsed
+    """
+    rotate_match = re.search(r'Rotate:\s*(\d+)', osd)
+    confidence_match = re.search(r'Orientation confidence:\s*([\d.]+)', osd)
+    if not rotate_match or not confidence_match:
+        logger.debug(f"OSD output not parsed: '{osd}'")
+        return None
+    return int(rotate_match.group(1)) % 360, float(confidence_match.group(1))
+
+
+class OcrEngine(abc.ABC):
+    """Interface of an OCR backend. Engines are created once per worker by get_ocr_engine."""
+
+    name = 'base'
+
+    @abc.abstractmethod
+    def image_to_string(self, image: Image.Image, dpi: Optional[int] = None) -> str:
+        """
+        Run OCR on an image.
+
+        Args:
+            image: PIL image to process
+            dpi: Resolution of the image, if known
+
+        Returns:
+            Recognized text
+        """
 
-        rotations = [0, 90, 180, 270] if auto_rotate else [0]
-        for rotation in rotations:
-            rotated = page_img.rotate(-rotation, expand=True) if rotation != 0 else page_img
-            image_path = temp_dir / f"page_{page_num:03}_rot{rotation}.jpg"
+    @abc.abstractmethod
+    def detect_orientation(self, image: Image.Image) -> Optional[Tuple[int, float]]:
+        """
+        Run orientation detection on an image.
+
+        Args:
+            image: PIL image to process
+
+        Returns:
+            Tuple of (clockwise rotation in degrees needed to make the page
+            upright, orientation confidence), or None if detection failed
+        """
+
+
+class PytesseractEngine(OcrEngine):
+    """Fallback backend that starts the tesseract binary for every call."""
+
+    name = 'pytesseract'
+
+    def image_to_string(self, image: Image.Image, dpi: Optional[int] = None) -> str:
+        args = ('-l', OCR_LANGUAGE) + (('--dpi', str(dpi)) if dpi else ())
+        return run_tesseract(image, *args)
+
+    def detect_orientation(self, image: Image.Image) -> Optional[Tuple[int, float]]:
+        try:
+            osd = run_tesseract(image, '--psm', '0')
+        except pytesseract.TesseractError as e:
+            logger.debug(f"OSD failed: {e}")
+            return None
+        return _parse_osd(osd)
+
+
+class TesserocrEngine(OcrEngine):
+    """
+    Backend that keeps tesseract resident through the tesserocr API, so the
+    language models are loaded once per worker instead of once per call.
+    """
+
+    name = 'tesserocr'
+
+    def __init__(self):
+        self._api = tesserocr.PyTessBaseAPI(lang=OCR_LANGUAGE)
+        self._osd_api = None
+
+    def image_to_string(self, image: Image.Image, dpi: Optional[int] = None) -> str:
+        self._api.SetImage(image)
+        if dpi:
+            self._api.SetSourceResolution(dpi)
+        return self._api.GetUTF8Text()
+
+    def detect_orientation(self, image: Image.Image) -> Optional[Tuple[int, float]]:
+        if self._osd_api is None:
+            self._osd_api = tesserocr.PyTessBaseAPI(psm=tesserocr.PSM.OSD_ONLY)
+        self._osd_api.SetImage(image)
+        try:
+            result = self._osd_api.DetectOrientationScript()
+        except RuntimeError as e:
+            logger.debug(f"OSD failed: {e}")
+            return None
+        if not result:
+            return None
+        # orient_deg is the counter-clockwise orientation of the text
+        return (360 - result['orient_deg']) % 360, float(result['orient_conf'])
+
+
+def create_ocr_engine(backend: str = OCR_BACKEND) -> OcrEngine:
+    """
+    Create an OCR engine, falling back to pytesseract if the requested
+    backend is not available.
+
+    Args:
+        backend: 'tesserocr' or 'pytesseract'
+
+    Returns:
+        The created OCR engine
+    """
+    if backend == 'tesserocr':
+        if tesserocr is None:
+            logger.debug("tesserocr not installed, using pytesseract backend")
+        else:
             try:
-                rotated.save(str(image_path), "JPEG")
-                text = pytesseract.image_to_string(Image.open(image_path))
-                text = text.replace("-\n", "")
-                score = score_ocr_text(text)
-
-                if score > best_score:
-                    best_score = score
-                    best_text = text
-                    best_rotation = rotation
-            finally:
-                image_path.unlink(missing_ok=True)
+                return TesserocrEngine()
+            except RuntimeError as e:
+                logger.warning(f"Failed to initialize tesserocr, using pytesseract backend: {e}")
+    return PytesseractEngine()
 
+
+def get_ocr_engine() -> OcrEngine:
+    """
+    Return the long-lived OCR engine of the current worker. Engines are not
+    shared between threads, and a forked pool worker creates its own instead
+    of reusing the handle inherited from its parent.
+
+    Returns:
+        The OCR engine for this process and thread
+    """
+    if getattr(_ocr_engine_local, 'pid', None) != os.getpid():
+        _ocr_engine_local.engine = create_ocr_engine()
+        _ocr_engine_local.pid = os.getpid()
+        logger.debug(f"Using OCR backend '{_ocr_engine_local.engine.name}' in process {os.getpid()}")
+    return _ocr_engine_local.engine
+
+
+def detect_orientation(page_img: Image.Image, dpi: int = OCR_DPI) -> Optional[int]:
+    """
+    Detect page orientation with Tesseract OSD on a low-resolution thumbnail.
+
+    Args:
+        page_img: Rasterized page image
+        dpi: Resolution the page was rasterized at
+
+    Returns:
+        Clockwise rotation in degrees needed to make the page upright, or
+        None if OSD failed or its confidence is below OSD_MIN_CONFIDENCE
+    """
+    thumbnail = page_img.reduce(max(1, dpi // THUMBNAIL_DPI))
+    result = get_ocr_engine().detect_orientation(thumbnail)
+    if result is None:
+        return None
+
+    rotation, confidence = result
+    if confidence < OSD_MIN_CONFIDENCE:
+        logger.debug(f"OSD confidence too low: {confidence}")
+        return None
+    return rotation
+
+
+def _otsu_threshold(gray: Image.Image) -> int:
+    """
+    Compute a global binarization threshold with Otsu's method.
+
+    Args:
+        gray: Grayscale image
+
+    Returns:
+        Threshold in 0..255; pixels above it are background
+    """
+    histogram = gray.histogram()[:256]
+    total = sum(histogram)
+    sum_all = sum(i * count for i, count in enumerate(histogram))
+
+    weight_bg = 0
+    sum_bg = 0
+    best_threshold = 127
+    best_variance = -1.0
+    for threshold, count in enumerate(histogram):
+        weight_bg += count
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += threshold * count
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        variance = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if variance > best_variance:
+            best_variance = variance
+            best_threshold = threshold
+    return best_threshold
+
+
+def _row_profile(binary: Image.Image) -> List[float]:
+    """Return the mean brightness of every row of an image (0 = all ink)."""
+    return list(binary.resize((1, binary.height), Image.BOX).getdata())
+
+
+def estimate_line_height(binary: Image.Image) -> Optional[float]:
+    """
+    Estimate the typical text line height from the horizontal projection
+    profile of a binarized page.
+
+    Args:
+        binary: Binarized grayscale page image (ink is dark)
+
+    Returns:
+        Median line height in pixels, or None if no text lines were found
+    """
+    runs = []
+    run_length = 0
+    for value in _row_profile(binary):
+        if value < 250:
+            run_length += 1
+        elif run_length:
+            runs.append(run_length)
+            run_length = 0
+    if run_length:
+        runs.append(run_length)
+
+    runs = sorted(r for r in runs if r >= 2)
+    if not runs:
+        return None
+    return float(runs[len(runs) // 2])
+
+
+def estimate_skew(binary: Image.Image) -> float:
+    """
+    Estimate the skew angle of a page by finding the rotation whose
+    horizontal projection profile is sharpest.
+
+    Args:
+        binary: Binarized grayscale page image (ink is dark)
+
+    Returns:
+        Counter-clockwise angle in degrees that deskews the page
+    """
+    best_angle = 0.0
+    best_score = -1.0
+    steps = int(DESKEW_MAX_ANGLE / DESKEW_STEP)
+    for step in range(-steps, steps + 1):
+        angle = step * DESKEW_STEP
+        rotated = binary.rotate(angle, fillcolor=255) if angle else binary
+        profile = _row_profile(rotated)
+        score = sum((b - a) ** 2 for a, b in zip(profile, profile[1:]))
+        if score > best_score:
+            best_score = score
+            best_angle = angle
+    return best_angle
+
+
+def preprocess_page(page_img: Image.Image, dpi: int,
+                    target_dpi: Optional[int] = None) -> Tuple[Image.Image, int]:
+    """
+    Prepare a page for OCR: grayscale conversion, downscaling to a resolution
+    that fits the text size on the page, deskewing and binarization.
+
+    Args:
+        page_img: Rasterized page image
+        dpi: Resolution the page was rasterized at
+        target_dpi: Resolution to downscale to; estimated from the text line
+            height when None
+
+    Returns:
+        Tuple of (binarized image, its resolution in DPI)
+    """
+    gray = page_img.convert('L')
+    thumbnail = gray.reduce(max(1, dpi // THUMBNAIL_DPI))
+    thumbnail_dpi = dpi * thumbnail.height / gray.height
+    threshold = _otsu_threshold(thumbnail)
+    thumbnail = thumbnail.point(lambda p: 255 if p > threshold else 0)
+
+    angle = estimate_skew(thumbnail)
+    if angle:
+        thumbnail = thumbnail.rotate(angle, fillcolor=255)
+
+    if target_dpi is None:
+        target_dpi = dpi
+        line_height = estimate_line_height(thumbnail)
+        if line_height:
+            line_height_inch = line_height / thumbnail_dpi
+            target_dpi = int(OCR_TARGET_LINE_HEIGHT_PX / line_height_inch)
+        target_dpi = max(OCR_MIN_DPI, min(dpi, target_dpi))
+
+    if target_dpi < dpi:
+        scale = target_dpi / dpi
+        gray = gray.resize((max(1, int(gray.width * scale)), max(1, int(gray.height * scale))),
+                           Image.BOX)
+
+    if angle:
+        gray = gray.rotate(angle, resample=Image.BILINEAR, fillcolor=255)
+
+    threshold = _otsu_threshold(gray)
+    return gray.point(lambda p: 255 if p > threshold else 0, mode='1'), target_dpi
+
+
+def ocr_page_adaptive(page_img: Image.Image, dpi: int, retry: bool = True) -> Tuple[str, int]:
+    """
+    OCR a page after preprocessing it at an adaptive resolution. If the
+    result scores below OCR_RETRY_MIN_SCORE and retry is set, the page is
+    OCRed again at its full resolution and the better result is kept.
+
+    Args:
+        page_img: Upright rasterized page image
+        dpi: Resolution the page was rasterized at
+        retry: If False, skip the full-resolution retry (see retry_full_resolution)
+
+    Returns:
+        Tuple of (OCR text with hyphenated line breaks joined, resolution it was read at)
+    """
+    engine = get_ocr_engine()
+    processed, target_dpi = preprocess_page(page_img, dpi)
+    text = engine.image_to_string(processed, target_dpi).replace("-\n", "")
+    if retry:
+        text = retry_full_resolution(page_img, dpi, target_dpi, text)
+    return text, target_dpi
+
+
+def retry_full_resolution(page_img: Image.Image, dpi: int, target_dpi: int, text: str) -> str:
+    """
+    OCR a page again at its full resolution if the adaptive result scores
+    below OCR_RETRY_MIN_SCORE and was read at a lower resolution.
+
+    Args:
+        page_img: Upright rasterized page image
+        dpi: Resolution the page was rasterized at
+        target_dpi: Resolution the adaptive result was read at
+        text: Adaptive OCR result
+
+    Returns:
+        The better of the two results
+    """
+    if score_ocr_text(text) >= OCR_RETRY_MIN_SCORE or target_dpi >= dpi:
+        return text
+    logger.debug(f"Low OCR score at {target_dpi} DPI, retrying at {dpi} DPI")
+    processed, _ = preprocess_page(page_img, dpi, target_dpi=dpi)
+    retry_text = get_ocr_engine().image_to_string(processed, dpi).replace("-\n", "")
+    return retry_text if score_ocr_text(retry_text) > score_ocr_text(text) else text
+
+
+def _ocr_page_image(page_img: Image.Image, auto_rotate: bool,
+                    dpi: int = OCR_DPI) -> Tuple[str, int]:
+    """
+    OCR a single rasterized page, optionally correcting its rotation.
+    The rotation is taken from detect_orientation when it is confident;
+    otherwise all 4 rotations are OCRed and the best result is kept. While
+    searching rotations, only the winning one gets the full-resolution retry.
+
+    Args:
+        page_img: Rasterized page image
+        auto_rotate: If True, detect and correct the page rotation
+        dpi: Resolution the page was rasterized at
+
+    Returns:
+        Tuple of (best OCR text, rotation in degrees that produced it)
+    """
+    best_text = ""
+    best_score = 0.0
+    best_rotation = 0
+    best_dpi = dpi
+
+    rotations = [0]
+    if auto_rotate:
+        detected = detect_orientation(page_img, dpi)
+        rotations = [detected] if detected is not None else [0, 90, 180, 270]
+
+    for rotation in rotations:
+        rotated = page_img.rotate(-rotation, expand=True) if rotation != 0 else page_img
+        text, target_dpi = ocr_page_adaptive(rotated, dpi, retry=len(rotations) == 1)
+        score = score_ocr_text(text)
+
+        if score > best_score:
+            best_score = score
+            best_text = text
+            best_rotation = rotation
+            best_dpi = target_dpi
+
+    if len(rotations) > 1 and best_text:
+        rotated = page_img.rotate(-best_rotation, expand=True) if best_rotation != 0 else page_img
+        best_text = retry_full_resolution(rotated, dpi, best_dpi, best_text)
+
+    return best_text, best_rotation
+
+
+def _ocr_pdf_page(pdf_path: str, page_num: int, auto_rotate: bool,
+                  dpi: int = OCR_DPI) -> Tuple[str, int]:
+    """
+    Rasterize and OCR one page of a PDF. Entry point for OCR pool workers,
+    so only the path travels between processes and not the page bitmap.
+
+    Args:
+        pdf_path: Path to the PDF file
+        page_num: 1-based page number to process
+        auto_rotate: If True, detect and correct the page rotation
+        dpi: Rasterization resolution
+
+    Returns:
+        Tuple of (best OCR text, rotation in degrees)
+    """
+    page_img = convert_from_path(pdf_path, dpi, first_page=page_num, last_page=page_num)[0]
+    try:
+        return _ocr_page_image(page_img, auto_rotate, dpi)
+    finally:
+        page_img.close()
+
+
+def iter_page_images(pdf_path: str, page_count: int, dpi: int = OCR_DPI,
+                     window: int = RASTER_WINDOW, page_bytes: int = 0) -> Iterator[Image.Image]:
+    """
+    Rasterize a PDF lazily, `window` pages at a time. Only the images of the
+    current window are held in memory; they are closed before the next
+    window is rendered. Each window holds its share of raster_budget while
+    it is in memory.
+
+    Args:
+        pdf_path: Path to the PDF file
+        page_count: Number of pages in the PDF
+        dpi: Rasterization resolution
+        window: Number of pages rasterized together
+        page_bytes: Estimated raster memory per page (see plan_rasterization)
+
+    Yields:
+        Page images in page order
+    """
+    for first_page in range(1, page_count + 1, window):
+        last_page = min(first_page + window - 1, page_count)
+        reserved = raster_budget.acquire(page_bytes * (last_page - first_page + 1))
+        images = []
+        try:
+            images = convert_from_path(pdf_path, dpi, first_page=first_page, last_page=last_page)
+            yield from images
+        finally:
+            for image in images:
+                image.close()
+            raster_budget.release(reserved)
+
+
+def plan_rasterization(reader: PdfReader) -> Tuple[int, int, int]:
+    """
+    Pick the rasterization resolution, estimate the raster memory a page
+    needs while it is OCRed (bitmap plus working copies, see
+    RASTER_WORKING_SET_FACTOR) and the number of pages that fit in
+    MAX_RASTER_MEMORY_MB. If a single page would exceed the cap at OCR_DPI,
+    the resolution is lowered for this document.
+
+    Args:
+        reader: PdfReader of the document
+
+    Returns:
+        Tuple of (dpi, maximum number of resident pages, estimated bytes per page)
+    """
+    cap = MAX_RASTER_MEMORY_MB * 1024 * 1024
+    largest_area = max((float(p.mediabox.width) * float(p.mediabox.height) for p in reader.pages),
+                       default=0.0)
+    # Page size is in points (1/72 inch); bitmaps are RGB
+    page_bytes = largest_area / (72 * 72) * OCR_DPI * OCR_DPI * 3 * RASTER_WORKING_SET_FACTOR
+
+    dpi = OCR_DPI
+    if page_bytes > cap:
+        dpi = int(OCR_DPI * math.sqrt(cap / page_bytes))
+        page_bytes = cap
+        logger.info(f"Page too large for raster memory cap, using {dpi} DPI")
+
+    max_pages = int(cap // page_bytes) if page_bytes else 1
+    return dpi, max(1, max_pages), int(page_bytes)
+
+
+def _get_ocr_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Return the shared OCR process pool, (re)creating it if the requested
+    size changed. The pool is kept alive across documents to avoid paying
+    the worker start-up cost for every file.
+
+    Args:
+        workers: Number of worker processes
+
+    Returns:
+        The shared ProcessPoolExecutor
+    """
+    global _ocr_pool, _ocr_pool_size
+    with _ocr_pool_lock:
+        if _ocr_pool is None or _ocr_pool_size != workers:
+            if _ocr_pool is not None:
+                _ocr_pool.shutdown()
+            _ocr_pool = ProcessPoolExecutor(max_workers=workers)
+            _ocr_pool_size = workers
+        return _ocr_pool
+
+
+def _iter_ocr_pages(pdf_path: str, page_count: int, auto_rotate: bool, workers: int,
+                    dpi: int, max_resident: int, page_bytes: int) -> Iterator[Tuple[str, int]]:
+    """
+    Rasterize and OCR the pages of a PDF lazily, yielding results in page order.
+    With more than one worker, pages are processed ahead of the consumer on
+    the OCR pool; pages not yet started are cancelled when the consumer
+    stops early. At most `max_resident` page bitmaps of this document exist
+    at any time, and every page holds its page_bytes of raster_budget until
+    it is OCRed, which caps raster memory across all documents.
+
+    Args:
+        pdf_path: Path to the PDF file
+        page_count: Number of pages in the PDF
+        auto_rotate: If True, detect and correct the rotation of each page
+        workers: Number of OCR worker processes
+        dpi: Rasterization resolution
+        max_resident: Maximum number of page bitmaps held in memory
+        page_bytes: Estimated raster memory per page (see plan_rasterization)
+
+    Yields:
+        Tuple of (OCR text, rotation in degrees) per page
+    """
+    if workers <= 1 or page_count <= 1:
+        window = max(1, min(RASTER_WINDOW, max_resident))
+        for page_img in iter_page_images(pdf_path, page_count, dpi, window, page_bytes):
+            yield _ocr_page_image(page_img, auto_rotate, dpi)
+        return
+
+    lookahead = max(1, min(workers, max_resident))
+    pool = _get_ocr_pool(workers)
+    pending: Dict[int, Future] = {}
+    try:
+        for page_num in range(1, page_count + 1):
+            for ahead in range(page_num, min(page_num + lookahead, page_count + 1)):
+                if ahead not in pending:
+                    reserved = raster_budget.acquire(page_bytes)
+                    future = pool.submit(_ocr_pdf_page, pdf_path, ahead, auto_rotate, dpi)
+                    # Released as soon as the worker is done (or the page is cancelled), not when
+                    # the result is consumed, so waiting documents cannot hold each other up
+                    future.add_done_callback(lambda _, reserved=reserved: raster_budget.release(reserved))
+                    pending[ahead] = future
+            yield pending.pop(page_num).result()
+    finally:
+        for future in pending.values():
+            future.cancel()
+
+
+def ocr_pages(pdf_path: str, auto_rotate: bool = True, workers: Optional[int] = None,
+              char_budget: Optional[int] = None) -> Tuple[List[str], List[int]]:
+    """
+    OCR the pages of a PDF without modifying the file.
+    Optionally detects the rotation of each page, using cheap orientation
+    detection and falling back to trying all 4 rotations (0, 90, 180, 270)
+    when it is not confident.
+
+    Pages are rasterized and OCRed one at a time, in parallel on a process
+    pool when more than one worker is used; the page order of the result is
+    preserved. With a char_budget, OCR stops after the page that fills it
+    and the remaining pages are left untouched. Estimated raster memory of
+    all documents being OCRed is capped by MAX_RASTER_MEMORY_MB through
+    raster_budget.
+
+    Args:
+        pdf_path: Path to the PDF file to process
+        auto_rotate: If True, detect the rotation of each page
+        workers: Number of OCR worker processes (defaults to OCR_WORKERS)
+        char_budget: Stop once this many characters were extracted (None = all pages)
+
+    Returns:
+        Tuple of (OCR text per inspected page, rotation in degrees per inspected page)
+    """
+    if workers is None:
+        workers = OCR_WORKERS
+
+    reader = PdfReader(pdf_path)
+    page_count = len(reader.pages)
+    dpi, max_resident, page_bytes = plan_rasterization(reader)
+
+    page_texts = []
+    best_rotations = []
+    text_length = 0
+    page_results = _iter_ocr_pages(pdf_path, page_count, auto_rotate, workers, dpi, max_resident, page_bytes)
+    for page_num, (best_text, best_rotation) in enumerate(page_results, start=1):
+        page_texts.append(best_text)
         best_rotations.append(best_rotation)
-        output_text += best_text
+        text_length += len(best_text)
         if best_rotation != 0:
             logger.info(f"Page {page_num}: rotated {best_rotation}°")
+        if char_budget is not None and text_length >= char_budget:
+            page_results.close()
+            if page_num < page_count:
+                logger.debug(f"Text budget reached after page {page_num}/{page_count}")
+            break
+
+    logger.info(f"{Path(pdf_path).name}: OCRed {len(page_texts)}/{page_count} pages at {dpi} DPI "
+                f"(~{page_bytes / (1024 * 1024):.0f} MB raster memory per page)")
+
+    return page_texts, best_rotations
+
+
+def apply_page_rotations(pdf_path: str, rotations: List[int]) -> bool:
+    """
+    Rewrite a PDF with its pages rotated clockwise by the given angles.
+    Pages beyond the end of `rotations` are left as they are.
+
+    Args:
+        pdf_path: Path to the PDF file, overwritten in place
+        rotations: Rotation in degrees per page, starting at the first page
+
+    Returns:
+        True if any page was rotated
+    """
+    if not any(r != 0 for r in rotations):
+        return False
+
+    reader = PdfReader(pdf_path)
+    writer = PdfWriter()
+    for page_idx, page in enumerate(reader.pages):
+        if page_idx < len(rotations) and rotations[page_idx] != 0:
+            page.rotate(rotations[page_idx])
+        writer.add_page(page)
+    with open(pdf_path, 'wb') as f:
+        writer.write(f)
+    return True
+
+
+def ocr_header_region(pdf_path: str, auto_rotate: bool = True) -> Tuple[str, int]:
+    """
+    OCR only the header region of the first page: the top HEADER_REGION_FRACTION,
+    which normally holds the letterhead, address block, subject line and
+    date. The PDF file is not modified.
+
+    Args:
+        pdf_path: Path to the PDF file
+        auto_rotate: If True, detect the rotation of the first page
+
+    Returns:
+        Tuple of (header text, rotation in degrees of the first page)
+    """
+    dpi, _, page_bytes = plan_rasterization(PdfReader(pdf_path))
+    reserved = raster_budget.acquire(page_bytes)
+    try:
+        page_img = convert_from_path(pdf_path, dpi, first_page=1, last_page=1)[0]
+    except Exception:
+        raster_budget.release(reserved)
+        raise
+    try:
+        rotation = 0
+        if auto_rotate:
+            rotation = detect_orientation(page_img, dpi) or 0
+        upright = page_img.rotate(-rotation, expand=True) if rotation != 0 else page_img
+        header = upright.crop((0, 0, upright.width, int(upright.height * HEADER_REGION_FRACTION)))
+        text, _ = ocr_page_adaptive(header, dpi)
+    finally:
+        page_img.close()
+        raster_budget.release(reserved)
+
+    if rotation != 0:
+        logger.info(f"Page 1: rotated {rotation}°")
+    return text, rotation
+
+
+def ocr_cache_key(content_hash: str, auto_rotate: bool, char_budget: Optional[int],
+                  ocr_profile: str) -> str:
+    """
+    Build the OCR cache key from the PDF content hash and every setting that
+    changes the OCR result.
+
+    Args:
+        content_hash: SHA-256 of the PDF file
+        auto_rotate: Rotation mode
+        char_budget: Character budget OCR stopped at
+        ocr_profile: 'full' or 'fast'
+
+    Returns:
+        Cache key
+    """
+    return (f"{content_hash}|dpi={OCR_DPI}|rotate={auto_rotate}|lang={OCR_LANGUAGE}"
+            f"|budget={char_budget}|profile={ocr_profile}")
 
-    # Rewrite the PDF with correctly rotated pages
-    was_rotated = any(r != 0 for r in best_rotations)
-    if was_rotated:
+
+def extract_text_layer(pdf_path: str) -> Optional[List[str]]:
+    """
+    Read the embedded text layer of a PDF, if it is good enough to replace OCR.
+    Digitally generated PDFs (invoices, statements) carry their text already,
+    so rasterizing and OCRing them is wasted work.
+
+    Args:
+        pdf_path: Path to the PDF file
+
+    Returns:
+        Embedded text per page, or None if the PDF has no usable text layer
+        (average score_ocr_text per page below TEXT_LAYER_MIN_SCORE)
+    """
+    try:
         reader = PdfReader(pdf_path)
-        writer = PdfWriter()
-        for page_idx, rotation in enumerate(best_rotations):
-            page = reader.pages[page_idx]
-            if rotation != 0:
-                page.rotate(rotation)
-            writer.add_page(page)
-        with open(pdf_path, 'wb') as f:
-            writer.write(f)
+        page_texts = [page.extract_text() or "" for page in reader.pages]
+    except Exception as e:
+        logger.debug(f"Could not read text layer of {pdf_path}: {e}")
+        return None
+
+    page_count = max(1, len(reader.pages))
+    if score_ocr_text("".join(page_texts)) / page_count < TEXT_LAYER_MIN_SCORE:
+        return None
+    return page_texts
+
+
+def get_document_text(pdf_path: str, auto_rotate: bool = True,
+                      char_budget: Optional[int] = OCR_TEXT_BUDGET,
+                      ocr_profile: str = 'full',
+                      token_budget: Optional[int] = LLM_TOKEN_BUDGET,
+                      keep_terms: Optional[List[str]] = None) -> Tuple[str, str]:
+    """
+    Get the text of a PDF, preferring its embedded text layer and falling
+    back to OCR. OCR results are cached by PDF content and OCR settings, so
+    a re-sent or re-processed file is not OCRed again. Pages found to be
+    rotated are corrected in the PDF. Records the chosen source in run_stats.
+
+    With a token_budget, the text is condensed to its most informative
+    lines (see TextCondenser.condense) instead of being cut at char_budget.
+
+    Args:
+        pdf_path: Path to the PDF file
+        auto_rotate: If True, detect and correct page rotation during OCR
+        char_budget: Characters needed by the caller; OCR stops once they
+            are available (None = all pages)
+        ocr_profile: 'full' to OCR whole pages, 'fast' to OCR only the
+            header region of the first page (see ocr_header_region)
+        token_budget: Approximate tokens of condensed text to return
+            (None = the raw text cut to char_budget)
+        keep_terms: Words that make a line more likely to be kept when
+            condensing (e.g. the configured names)
+
+    Returns:
+        Tuple of (document text with newlines replaced by spaces, source:
+        'text_layer', 'ocr' or 'header_ocr' for the first-page header only)
+    """
+    page_texts = extract_text_layer(pdf_path)
+    if page_texts is not None:
+        count_run_stat('text_layer')
+        logger.debug(f"Using embedded text layer of {pdf_path}")
+        return prepare_llm_text(page_texts, char_budget, token_budget, keep_terms), 'text_layer'
+
+    source = 'header_ocr' if ocr_profile == 'fast' else 'ocr'
+    content_hash = CacheManager.file_hash(pdf_path)
+    cache_key = ocr_cache_key(content_hash, auto_rotate, char_budget, ocr_profile)
+    entry = ocr_cache.get(cache_key)
+    if entry is not None:
+        count_run_stat('ocr_cache_hits')
+        logger.debug(f"Using cached OCR result for {pdf_path}")
+        page_texts, rotations = entry['pages'], entry['rotations']
+    elif ocr_profile == 'fast':
+        count_run_stat('header_ocr')
+        header_text, rotation = ocr_header_region(pdf_path, auto_rotate)
+        page_texts, rotations = [header_text], [rotation]
+    else:
+        count_run_stat('ocr')
+        page_texts, rotations = ocr_pages(pdf_path, auto_rotate, char_budget=char_budget)
+
+    if entry is None:
+        ocr_cache.put(cache_key, {'pages': page_texts, 'rotations': rotations})
+    if apply_page_rotations(pdf_path, rotations):
+        count_run_stat('rotated')
+        # The rewritten file is already upright, remember it under its new hash too
+        rotated_key = ocr_cache_key(CacheManager.file_hash(pdf_path), auto_rotate, char_budget, ocr_profile)
+        ocr_cache.put(rotated_key, {'pages': page_texts, 'rotations': [0] * len(rotations)})
+
+    return prepare_llm_text(page_texts, char_budget, token_budget, keep_terms), source
+
+
+def prepare_llm_text(page_texts: List[str], char_budget: Optional[int],
+                     token_budget: Optional[int], keep_terms: Optional[List[str]]) -> str:
+    """
+    Turn page texts into the document text used in prompts, and record how
+    much it was reduced in run_stats.
+
+    Args:
+        page_texts: Text per page, with lines separated by newlines
+        char_budget: Length the raw text is cut to without a token_budget
+        token_budget: Approximate tokens of condensed text (None = no condensing)
+        keep_terms: Words that make a line more likely to be kept
 
-    return output_text.replace("\n", " "), was_rotated
+    Returns:
+        Document text with newlines replaced by spaces
+    """
+    raw_text = "".join(page_texts).replace("\n", " ")
+    if token_budget is None:
+        return raw_text[:char_budget]
+
+    text = TextCondenser.condense(page_texts, token_budget, keep_terms)
+    count_run_stat('raw_tokens', TextCondenser.estimate_tokens(raw_text))
+    count_run_stat('prompt_tokens', TextCondenser.estimate_tokens(text))
+    return text
 
 
 def longest_string(strings: List[str]) -> str:
@@ -336,8 +1228,166 @@ def highest_count_by_two(data_dict: Dict[str, int]) -> Optional[str]:
     return None
 
 
+def run_until_decided(tasks: List[Tuple[Any, Callable[[], R]]], max_in_flight: int,
+                      on_result: Callable[[Any, R], Optional[T]]) -> Optional[T]:
+    """
+    Run LLM requests on a thread pool, at most max_in_flight at a time, and
+    feed each response to on_result as it arrives. As soon as on_result
+    returns a value, outstanding requests are cancelled and the value is
+    returned. With max_in_flight=1 the tasks run strictly in order.
+
+    Args:
+        tasks: List of (tag, request function) pairs, in submission order
+        max_in_flight: Maximum number of concurrent requests
+        on_result: Called with (tag, response); returns the final result or None
+
+    Returns:
+        The first non-None value of on_result, or None if all tasks were used up
+
+    Raises:
+        Exception: Re-raises the first exception raised by a request
+    """
+    task_iter = iter(tasks)
+    pending: Dict[Future, Any] = {}
+    executor = ThreadPoolExecutor(max_workers=max(1, max_in_flight))
+
+    def submit_next() -> None:
+        task = next(task_iter, None)
+        if task is not None:
+            tag, fn = task
+            pending[executor.submit(fn)] = tag
+
+    try:
+        for _ in range(max(1, max_in_flight)):
+            submit_next()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                tag = pending.pop(future)
+                result = on_result(tag, future.result())
+                if result is not None:
+                    return result
+                submit_next()
+        return None
+    finally:
+        # Requests already on the wire finish in the background; queued ones are dropped
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def sample_schedule(template_order: List[int], parallel: bool) -> List[Tuple[int, int]]:
+    """
+    Order in which (template index, attempt) LLM samples are requested.
+    Sequentially each template is retried before moving on to the next. In
+    parallel, samples are ordered by attempt plus rank of their template,
+    so the first wave holds the best-ranked templates (first attempts before
+    retries on ties) and a low-ranked template only joins once better ones
+    used up some attempts.
+
+    Args:
+        template_order: Template indices in the order they should be tried
+        parallel: True if several samples are in flight at once
+
+    Returns:
+        List of (template index, attempt) pairs
+    """
+    schedule = [(idx, attempt) for idx in template_order for attempt in range(RETRIES)]
+    if parallel:
+        schedule.sort(key=lambda item: (item[1] + template_order.index(item[0]), item[1]))
+    return schedule
+
+
+def template_order(kind: str, template_count: int) -> List[int]:
+    """
+    Order in which the prompt templates of a family are tried: by expected
+    cost to success from the persisted prompt history when
+    ADAPTIVE_PROMPT_ORDER is set, otherwise as written.
+
+    Args:
+        kind: Prompt family ('name', 'category' or 'recipe')
+        template_count: Number of prompt templates
+
+    Returns:
+        Template indices in the order they should be tried
+    """
+    if ADAPTIVE_PROMPT_ORDER:
+        return prompt_history.order(kind, template_count)
+    return list(range(template_count))
+
+
+def make_sampler(prompt_templates: List[str], input_text: str, url: str,
+                 api_token: str) -> Callable[[int, int], Tuple[str, Optional[float], str]]:
+    """
+    Build a function that requests one LLM sample for a template and attempt.
+    Only the first attempt of a template may be answered from the cache.
+    The prompt is returned so that an accepted response can be cached.
+    The latency is that of the HTTP request alone, and None for a cache
+    hit, which says nothing about the template and is not recorded in the
+    prompt history.
+
+    Args:
+        prompt_templates: Prompt templates with a {content} placeholder
+        input_text: Extracted text from document
+        url: API endpoint URL
+        api_token: API authentication token
+
+    Returns:
+        Function (template index, attempt) -> (LLM response, latency in seconds or None, prompt)
+    """
+    def sample(idx: int, attempt: int) -> Tuple[str, Optional[float], str]:
+        full_text = prompt_templates[idx].format(content=input_text)
+        if attempt == 0:
+            llm_output = get_cached_llm_response(full_text)
+            if llm_output is not None:
+                return llm_output, None, full_text
+        llm_output, latency = request_llm(full_text, url, api_token)
+        return llm_output, latency, full_text
+
+    return sample
+
+
+def find_filename(kind: str, prompt_templates: List[str], input_text: str, url: str,
+                  api_token: str, tidy: Callable[[str], str],
+                  max_in_flight: int = 1) -> Optional[str]:
+    """
+    Prompt the LLM until it returns a valid filename. With max_in_flight > 1
+    the templates are fired speculatively in parallel and the first valid
+    response wins; the winning template is counted in prompt_stats.
+
+    Args:
+        kind: prompt_stats key ('name' or 'recipe')
+        prompt_templates: Prompt templates with a {content} placeholder
+        input_text: Extracted text from document
+        url: API endpoint URL
+        api_token: API authentication token
+        tidy: Cleans up a valid filename match
+        max_in_flight: Maximum number of concurrent requests
+
+    Returns:
+        Generated filename with date appended, or None if unsuccessful
+    """
+    sample = make_sampler(prompt_templates, input_text, url, api_token)
+
+    def check(task: Tuple[int, int], response: Tuple[str, Optional[float], str]) -> Optional[str]:
+        llm_output, latency, prompt = response
+        match = find_match(clean_llm_output(llm_output))
+        valid = is_valid(match)
+        if latency is not None:
+            prompt_history.record(kind, task[0], valid, latency)
+        if not valid:
+            return None
+        cache_llm_response(prompt, llm_output)
+        record_prompt_success(kind, task[0])
+        return append_date_to_filename(tidy(match))
+
+    order = template_order(kind, len(prompt_templates))
+    schedule = sample_schedule(order, max_in_flight > 1)
+    tasks = [(task, functools.partial(sample, *task)) for task in schedule]
+    return run_until_decided(tasks, max_in_flight, check)
+
+
 def get_document_name(url: str, input_text: str, names: Tuple[List[str], str],
-                      api_token: str, extra_context: Optional[str] = None) -> Optional[str]:
+                      api_token: str, extra_context: Optional[str] = None,
+                      max_in_flight: Optional[int] = None) -> Optional[str]:
     """
     Generate a document filename using LLM based on document text.
 
@@ -347,6 +1397,7 @@ def get_document_name(url: str, input_text: str, names: Tuple[List[str], str],
         names: Tuple of (firstnames, lastname)
         api_token: API authentication token
         extra_context: Optional additional context for LLM
+        max_in_flight: Speculative requests in flight at once (defaults to NAME_MAX_IN_FLIGHT)
 
     Returns:
         Generated filename with date appended, or None if unsuccessful
@@ -397,21 +1448,15 @@ def get_document_name(url: str, input_text: str, names: Tuple[List[str], str],
     ]
     if extra_context:
         prompt_templates = [p + f"\nKontext: {extra_context}" for p in prompt_templates]
+    if max_in_flight is None:
+        max_in_flight = NAME_MAX_IN_FLIGHT
 
-    for idx, prompt in enumerate(prompt_templates):
-        for _ in range(RETRIES):
-            full_text = prompt.format(content=input_text)
-            llm_output = ask_infomaniak_ai(full_text, url, api_token)
-            llm_output = clean_llm_output(llm_output)
-            match = find_match(llm_output)
-            if is_valid(match):
-                match = tidy_match(match, names)
-                prompt_stats['name'][idx] += 1
-                return append_date_to_filename(match)
-    return None
+    return find_filename('name', prompt_templates, input_text, url, api_token,
+                         lambda match: tidy_match(match, names), max_in_flight)
 
 
-def get_recipe_name(url: str, input_text: str, api_token: str) -> Optional[str]:
+def get_recipe_name(url: str, input_text: str, api_token: str,
+                    max_in_flight: Optional[int] = None) -> Optional[str]:
     """
     Generate a recipe filename using LLM based on OCR text from a recipe document.
 
@@ -419,6 +1464,7 @@ def get_recipe_name(url: str, input_text: str, api_token: str) -> Optional[str]:
         url: API endpoint URL
         input_text: Extracted text from recipe document
         api_token: API authentication token
+        max_in_flight: Speculative requests in flight at once (defaults to NAME_MAX_IN_FLIGHT)
 
     Returns:
         Generated filename with date appended, or None if unsuccessful
@@ -470,31 +1516,33 @@ def get_recipe_name(url: str, input_text: str, api_token: str) -> Optional[str]:
     Rezepttext:
     {content}"""),
     ]
+    if max_in_flight is None:
+        max_in_flight = NAME_MAX_IN_FLIGHT
 
-    for idx, prompt in enumerate(prompt_templates):
-        for _ in range(RETRIES):
-            full_text = prompt.format(content=input_text)
-            llm_output = ask_infomaniak_ai(full_text, url, api_token)
-            llm_output = clean_llm_output(llm_output)
-            match = find_match(llm_output)
-            if is_valid(match):
-                match = match.replace('"', "").replace("'", "").strip()
-                prompt_stats['recipe'][idx] += 1
-                return append_date_to_filename(match)
-    return None
+    return find_filename('recipe', prompt_templates, input_text, url, api_token,
+                         lambda match: match.replace('"', "").replace("'", "").strip(),
+                         max_in_flight)
 
 
 def get_document_category(url: str, input_text: str, categories_list: List[str],
-                         api_token: str, extra_context: Optional[str] = None) -> Optional[str]:
+                         api_token: str, extra_context: Optional[str] = None,
+                         parallel_votes: Optional[int] = None) -> Optional[str]:
     """
     Determine document category using LLM based on document text.
 
+    The LLM is sampled until one category leads by two votes, which in
+    practice is the first parseable answer (see highest_count_by_two). With
+    parallel_votes > 1, that many samples are in flight at once, spread
+    across the prompt templates; queued samples are dropped as soon as the
+    vote is decided, but requests already sent still count against the quota.
+
     Args:
         url: API endpoint URL
         input_text: Extracted text from document
         categories_list: List of valid category names
         api_token: API authentication token
         extra_context: Optional additional context for LLM
+        parallel_votes: Samples in flight at once (defaults to CATEGORY_PARALLEL_VOTES)
 
     Returns:
         Determined category or None if unsuccessful
@@ -552,20 +1600,194 @@ def get_document_category(url: str, input_text: str, categories_list: List[str],
     if extra_context:
         prompt_templates = [p + f"\nKontext: {extra_context}" for p in prompt_templates]
 
+    if parallel_votes is None:
+        parallel_votes = CATEGORY_PARALLEL_VOTES
+
+    sample = make_sampler(prompt_templates, input_text, url, api_token)
     category_counts: Dict[str, int] = {}
-    for idx, prompt in enumerate(prompt_templates):
-        for _ in range(RETRIES):
-            full_text = prompt.format(content=input_text)
-            llm_output = ask_infomaniak_ai(full_text, url, api_token)
-            llm_output = clean_llm_output(llm_output)
-            cat = find_category(llm_output, categories_list)
-            if cat:
-                category_counts[cat] = category_counts.get(cat, 0) + 1
-                highest_category = highest_count_by_two(category_counts)
-                if highest_category:
-                    prompt_stats['category'][idx] += 1
-                    return highest_category
-    return None
+
+    def tally(task: Tuple[int, int], response: Tuple[str, Optional[float], str]) -> Optional[str]:
+        llm_output, latency, prompt = response
+        cat = find_category(clean_llm_output(llm_output), categories_list)
+        if latency is not None:
+            prompt_history.record('category', task[0], cat is not None, latency)
+        if not cat:
+            return None
+        cache_llm_response(prompt, llm_output)
+        category_counts[cat] = category_counts.get(cat, 0) + 1
+        highest_category = highest_count_by_two(category_counts)
+        if highest_category:
+            record_prompt_success('category', task[0])
+        return highest_category
+
+    order = template_order('category', len(prompt_templates))
+    schedule = sample_schedule(order, parallel_votes > 1)
+    tasks = [(task, functools.partial(sample, *task)) for task in schedule]
+    return run_until_decided(tasks, parallel_votes, tally)
+
+
+def parse_json_object(text: str) -> Optional[Dict]:
+    """
+    Extract the first JSON object from LLM output.
+
+    Args:
+        text: Raw text from LLM, possibly with surrounding prose or code fences
+
+    Returns:
+        Parsed object, or None if no valid JSON object was found
+    """
+    match = re.search(r'\{.*\}', text, re.DOTALL)
+    if not match:
+        logger.debug(f"JSON: no object found in '{text}'")
+        return None
+    try:
+        value = json.loads(match.group(0))
+    except ValueError:
+        logger.debug(f"JSON: invalid object in '{text}'")
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def get_document_info(url: str, input_text: str, names: Tuple[List[str], str],
+                      categories_list: List[str], api_token: str,
+                      extra_context: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Generate filename and category with a single LLM request asking for a
+    JSON object. Each field is validated with the same rules as the
+    per-field prompts; fields that fail validation are returned as None so
+    that only those need a fallback.
+
+    Args:
+        url: API endpoint URL
+        input_text: Extracted text from document
+        names: Tuple of (firstnames, lastname)
+        categories_list: List of valid category names
+        api_token: API authentication token
+        extra_context: Optional additional context for LLM
+
+    Returns:
+        Tuple of (filename with date appended or None, category or None)
+    """
+    prompt = f"""Analysiere den folgenden Text aus einem PDF-Dokument.
+
+    AUFGABEN:
+    1. Erstelle einen präzisen deutschen Dateinamen im Format Dokumenttyp_Firma_Thema_Datum.pdf
+       (Unterstriche statt Leerzeichen, maximal 60 Zeichen, keine Sonderzeichen außer Unterstriche und Bindestriche)
+    2. Ordne das Dokument EXAKT EINER dieser Kategorien zu: {' | '.join(categories_list)}
+    3. Gib an, wie sicher du dir bei der Kategorie bist (Zahl zwischen 0 und 1)
+
+    Antworte NUR mit einem JSON-Objekt in genau dieser Form, ohne Erklärungen:
+    {{{{"dateiname": "...", "kategorie": "...", "konfidenz": 0.0}}}}
+
+    Text des Dokuments:
+    {{content}}"""
+    if extra_context:
+        prompt += f"\nKontext: {extra_context}"
+
+    question = prompt.format(content=input_text)
+    llm_output = ask_infomaniak_ai(question, url, api_token)
+    result = parse_json_object(llm_output)
+    if result is None:
+        return None, None
+
+    doc_name = None
+    match = find_match(clean_llm_output(str(result.get('dateiname', ''))))
+    if is_valid(match):
+        doc_name = append_date_to_filename(tidy_match(match, names))
+        record_prompt_success('combined', 0)
+
+    doc_category = None
+    try:
+        confidence = float(result.get('konfidenz', 0))
+    except (TypeError, ValueError):
+        confidence = 0.0
+    category = find_category(clean_llm_output(str(result.get('kategorie', ''))), categories_list)
+    if category and confidence >= COMBINED_MIN_CONFIDENCE:
+        doc_category = category
+        record_prompt_success('combined', 1)
+    elif category:
+        logger.debug(f"CATEGORY: combined answer '{category}' below confidence ({confidence})")
+
+    if doc_name and doc_category:
+        cache_llm_response(question, llm_output)
+    return doc_name, doc_category
+
+
+def generate_name_and_category(url: str, input_text: str, names: Tuple[List[str], str],
+                               categories_list: List[str], api_token: str,
+                               doc_name: Optional[str] = None, doc_category: Optional[str] = None,
+                               want_category: bool = True,
+                               classifier: Optional[CategoryClassifier.CategoryClassifier] = None
+                               ) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Fill in the missing filename and category of a document. When both are
+    missing, want_category is set and COMBINED_PROMPT is set, a single
+    combined request is tried first; the per-field prompts then run concurrently, only for the fields
+    still missing.
+
+    If a local classifier is given and its confidence reaches
+    PRECLASSIFIER_MIN_CONFIDENCE, its category is used and the LLM vote is
+    skipped, except for a PRECLASSIFIER_AUDIT_RATE sample that still goes
+    to the LLM to measure agreement. Categories decided by the LLM are
+    added to the classifier's training history.
+
+    Args:
+        url: API endpoint URL
+        input_text: Extracted text from document
+        names: Tuple of (firstnames, lastname)
+        categories_list: List of valid category names
+        api_token: API authentication token
+        doc_name: Filename already determined, if any
+        doc_category: Category already determined, if any
+        want_category: If False, determine no category (neither the
+            combined nor the per-field category prompts run)
+        classifier: Optional local pre-classifier
+
+    Returns:
+        Tuple of (filename or None, category or None)
+    """
+    category_missing = doc_category is None
+    prediction = None
+    preclassified = False
+    if classifier is not None and want_category and category_missing:
+        prediction, confidence = classifier.predict(input_text)
+        count_run_stat('preclassifier_checked')
+        if prediction and confidence >= PRECLASSIFIER_MIN_CONFIDENCE:
+            if random.random() >= PRECLASSIFIER_AUDIT_RATE:
+                doc_category = prediction
+                preclassified = True
+                count_run_stat('preclassified')
+                logger.debug(f"CATEGORY: pre-classified as '{prediction}' ({confidence:.2f})")
+            else:
+                logger.debug(f"CATEGORY: auditing pre-classification '{prediction}' with LLM")
+
+    # Without want_category the category of a combined answer would bypass the
+    # pre-classifier and its training, so only the name prompts run then
+    if COMBINED_PROMPT and want_category and doc_name is None and doc_category is None:
+        doc_name, doc_category = get_document_info(url, input_text, names, categories_list, api_token)
+
+    # Name and category are independent, so their LLM round trips overlap
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        name_future = None
+        category_future = None
+        if doc_name is None:
+            name_future = executor.submit(get_document_name, url, input_text, names, api_token)
+        if want_category and doc_category is None:
+            category_future = executor.submit(get_document_category, url, input_text,
+                                              categories_list, api_token)
+        if name_future is not None:
+            doc_name = name_future.result()
+        if category_future is not None:
+            doc_category = category_future.result()
+
+    if classifier is not None and category_missing and not preclassified and doc_category:
+        classifier.learn(input_text, doc_category)
+        if prediction is not None:
+            count_run_stat('preclassifier_compared')
+            if prediction == doc_category:
+                count_run_stat('preclassifier_agreed')
+
+    return doc_name, doc_category
 
 
 def get_filename_and_category(new_filename: Optional[str], category: Optional[str],
@@ -615,14 +1837,21 @@ def get_name_part(text: str, name_list: List[str]) -> str:
     return result
 
 
-def ask_infomaniak_ai(question: str, url: str, api_token: str) -> str:
+def ask_infomaniak_ai(question: str, url: str, api_token: str, use_cache: bool = True) -> str:
     """
     Query Infomaniak AI API with a question.
 
+    Responses are looked up in the cache by (model, question). With
+    use_cache=False the lookup is skipped, which retries use to get a fresh
+    sample. Fresh responses are not stored here: callers store a response
+    with cache_llm_response once it passed their validation, so the cache
+    only holds accepted answers.
+
     Args:
         question: The prompt/question to send
         url: API endpoint URL
         api_token: API authentication token
+        use_cache: If True, return a cached response when available
 
     Returns:
         LLM response content
@@ -630,8 +1859,35 @@ def ask_infomaniak_ai(question: str, url: str, api_token: str) -> str:
     Raises:
         Exception: If API request fails
     """
-    model = "qwen3"
+    if use_cache:
+        content = get_cached_llm_response(question)
+        if content is not None:
+            return content
+    content, _ = request_llm(question, url, api_token)
+    return content
+
+
+def request_llm(question: str, url: str, api_token: str) -> Tuple[str, float]:
+    """
+    Send a question to the Infomaniak AI API, bypassing the cache.
+
+    Requests go through the shared llm_limiter. Throttled (429) and server
+    error responses are retried up to LLM_MAX_ATTEMPTS times, after the
+    Retry-After delay or the limiter's backoff.
+
+    Args:
+        question: The prompt/question to send
+        url: API endpoint URL
+        api_token: API authentication token
 
+    Returns:
+        Tuple of (LLM response content, duration of the answered HTTP request
+        in seconds, excluding limiter waits and failed attempts)
+
+    Raises:
+        Exception: If API request fails
+    """
+    model = LLM_MODEL
     data_dict = {
         "messages": [
             {
@@ -648,18 +1904,71 @@ def ask_infomaniak_ai(question: str, url: str, api_token: str) -> str:
         'Content-Type': 'application/json',
     }
 
+    latency = 0.0
+    for attempt in range(LLM_MAX_ATTEMPTS):
+        llm_limiter.acquire()
+        start = time.time()
+        outcome, retry_after = 'error', None
+        try:
+            response = HttpClient.post(url=url, data=data, headers=headers, retry_status=False)
+            if response.status_code in LLM_RETRY_STATUSES:
+                outcome = 'throttled' if response.status_code == 429 else 'error'
+                retry_after = RateLimiter.parse_retry_after(response.headers.get('Retry-After'))
+                logger.debug(f"API returned {response.status_code} (attempt {attempt + 1}/{LLM_MAX_ATTEMPTS})")
+                continue
+            outcome = 'ok'
+            break
+        except requests.exceptions.RequestException as e:
+            if attempt == LLM_MAX_ATTEMPTS - 1:
+                logger.error(f"API request failed: {e}")
+                raise
+            logger.debug(f"API request failed (attempt {attempt + 1}/{LLM_MAX_ATTEMPTS}): {e}")
+        finally:
+            latency = time.time() - start
+            llm_limiter.release(outcome, latency, retry_after)
+
     try:
-        response = requests.post(url=url, data=data, headers=headers)
         response.raise_for_status()
         response_dict = json.loads(response.text)
         if 'choices' in response_dict:
-            return response_dict['choices'][0]['message']['content']
+            return response_dict['choices'][0]['message']['content'], latency
         raise Exception(f"Unexpected API response: {response_dict.get('error', 'Unknown error')}")
     except requests.exceptions.RequestException as e:
         logger.error(f"API request failed: {e}")
         raise
 
 
+def get_cached_llm_response(question: str) -> Optional[str]:
+    """
+    Look up the cached LLM response for a question.
+
+    Args:
+        question: The prompt to send
+
+    Returns:
+        The cached response, or None if caching is off or nothing is cached
+    """
+    if not LLM_CACHE_ENABLED:
+        return None
+    entry = llm_cache.get(f"{LLM_MODEL}|{question}")
+    if entry is None:
+        return None
+    count_run_stat('llm_cache_hits')
+    return entry['content']
+
+
+def cache_llm_response(question: str, content: str) -> None:
+    """
+    Store an accepted LLM response for a question, replacing any cached one.
+
+    Args:
+        question: The prompt that was sent
+        content: The response that passed validation
+    """
+    if LLM_CACHE_ENABLED:
+        llm_cache.put(f"{LLM_MODEL}|{question}", {'content': content})
+
+
 def try_upload(input_dir: str, orig_filename: str, new_filename: str, folder: str,
                config: Config) -> Tuple[bool, str]:
     """
@@ -722,46 +2031,301 @@ def split_pdf_into_pages(pdf_path: Path) -> List[Path]:
         page_files.append(page_path)
 
     pdf_path.unlink()
-    run_stats['split'] += 1
-    run_stats['split_pages_total'] += len(page_files)
+    count_run_stat('split')
+    count_run_stat('split_pages_total', len(page_files))
     logger.info(f"Split {pdf_path.name} into {len(page_files)} pages")
 
     return page_files
 
 
-def process_document(file_path: str, names_tuple: Tuple[List[str], str],
-                     categories_dict: Dict, api_url: str, token: str,
-                     auto_rotate: bool = True) -> Tuple[str, str]:
+def document_keep_terms(names_tuple: Tuple[List[str], str]) -> List[str]:
+    """
+    Words that make a line worth keeping when condensing document text.
+
+    Args:
+        names_tuple: Tuple of (firstnames, lastname)
+
+    Returns:
+        The configured first names and last name
+    """
+    return names_tuple[0] + [names_tuple[1]]
+
+
+def name_document(content: str, names_tuple: Tuple[List[str], str], categories_dict: Dict,
+                  api_url: str, token: str, header_only: bool = False,
+                  classifier: Optional[CategoryClassifier.CategoryClassifier] = None
+                  ) -> Optional[Tuple[str, str]]:
     """
-    Process a single document file.
+    Name and categorize a document whose text was already extracted with
+    get_document_text.
+
+    With header_only (the 'fast' OCR profile), the text only covers the
+    header region of the first page; naming runs on it first, and if that
+    does not yield a valid name, None is returned so the caller can extract
+    the full text and call again without header_only. No OCR runs here.
 
     Args:
-        file_path: Path to the PDF file
+        content: Document text
         names_tuple: Tuple of (firstnames, lastname)
         categories_dict: Dictionary of categories
         api_url: API endpoint URL
         token: API authentication token
-        auto_rotate: If True, try all 4 rotations during OCR
+        header_only: True if content is the first-page header only
+        classifier: Optional local pre-classifier (see generate_name_and_category)
 
     Returns:
-        Tuple of (final_filename, category)
+        Tuple of (final_filename, category), or None if the header was not sufficient
     """
-    content, was_rotated = ocr_file(file_path, auto_rotate)
-    if was_rotated:
-        run_stats['rotated'] += 1
-    content = content[:2000]
+    categories_list = list(categories_dict.keys())
+
+    doc_name = None
+    if header_only:
+        doc_name, _ = generate_name_and_category(
+            api_url, content, names_tuple, categories_list, token, want_category=False
+        )
+        if doc_name is None:
+            return None
 
     name_part = get_name_part(content, names_tuple[0])
-    doc_name = get_document_name(api_url, content, names_tuple, token)
-    doc_category = get_document_category(api_url, content, list(categories_dict.keys()), token)
+    doc_name, doc_category = generate_name_and_category(
+        api_url, content, names_tuple, categories_list, token, doc_name,
+        classifier=classifier
+    )
 
     return get_filename_and_category(doc_name, doc_category, name_part)
 
 
+def create_job(file_path: Path) -> Dict[str, Any]:
+    """
+    Create the pipeline job for a downloaded PDF. The job dictionary is
+    filled in by the stages: 'content' and 'header_only' by
+    extract_text_stage (or full_text_stage), 'filename' and 'category' by
+    naming_stage.
+
+    Args:
+        file_path: PDF in a category subdirectory of input
+
+    Returns:
+        Job dictionary
+    """
+    return {'path': file_path, 'start_time': time.time()}
+
+
+def job_failed(job: Dict[str, Any], error: Exception) -> None:
+    """
+    Record a document that could not be processed (pipeline error handler).
+
+    Args:
+        job: Pipeline job
+        error: Exception raised by a stage
+    """
+    count_run_stat('failed')
+    logger.error(f"Error processing {job['path'].name}: {error}")
+
+
+def extract_text_stage(job: Dict[str, Any], emit: Callable[[Dict[str, Any]], None],
+                       names_tuple: Tuple[List[str], str], auto_rotate: bool = True) -> None:
+    """
+    Pipeline stage: extract the text of a document (text layer or OCR).
+    With the 'fast' OCR profile only the header region is OCRed, unless its
+    text is too short to name the document from.
+
+    Args:
+        job: Pipeline job (see create_job)
+        emit: Passes the job on to the next stage
+        names_tuple: Tuple of (firstnames, lastname)
+        auto_rotate: If True, detect and correct page rotation during OCR
+    """
+    file_path = str(job['path'])
+    # Recipes are named from their full text
+    if job['path'].parent.name == 'Rezepte':
+        job['content'], _ = get_document_text(file_path, auto_rotate)
+        job['header_only'] = False
+        emit(job)
+        return
+
+    keep_terms = document_keep_terms(names_tuple)
+    job['content'], source = get_document_text(file_path, auto_rotate, ocr_profile=OCR_PROFILE,
+                                               keep_terms=keep_terms)
+    # A text layer is the full text even with the fast profile
+    job['header_only'] = source == 'header_ocr'
+    if job['header_only'] and len(job['content'].strip()) < HEADER_MIN_CHARS:
+        logger.debug(f"Header region too short for {job['path'].name}, running full OCR")
+        job['content'], _ = get_document_text(file_path, auto_rotate, keep_terms=keep_terms)
+        job['header_only'] = False
+    emit(job)
+
+
+def full_text_stage(job: Dict[str, Any], emit: Callable[[Dict[str, Any]], None],
+                    names_tuple: Tuple[List[str], str], auto_rotate: bool = True) -> None:
+    """
+    Pipeline stage (fast OCR profile only): OCR the full document when its
+    header did not yield a name. Documents already named pass through.
+
+    Args:
+        job: Pipeline job
+        emit: Passes the job on to the next stage
+        names_tuple: Tuple of (firstnames, lastname)
+        auto_rotate: If True, detect and correct page rotation during OCR
+    """
+    if 'filename' not in job:
+        logger.debug(f"Header region not sufficient for {job['path'].name}, running full OCR")
+        job['content'], _ = get_document_text(str(job['path']), auto_rotate,
+                                              keep_terms=document_keep_terms(names_tuple))
+        job['header_only'] = False
+    emit(job)
+
+
+def naming_stage(job: Dict[str, Any], emit: Callable[[Dict[str, Any]], None],
+                 names_tuple: Tuple[List[str], str], categories: Dict, api_url: str,
+                 api_token: str,
+                 classifier: Optional[CategoryClassifier.CategoryClassifier] = None) -> None:
+    """
+    Pipeline stage: find the filename and category of a document with the LLM.
+    A document whose header text did not yield a name is passed on without
+    'filename', for full_text_stage; documents named by an earlier naming
+    stage pass through.
+
+    Args:
+        job: Pipeline job with 'content'
+        emit: Passes the job on to the next stage
+        names_tuple: Tuple of (firstnames, lastname)
+        categories: Dictionary of categories
+        api_url: AI API endpoint URL
+        api_token: API authentication token
+        classifier: Optional local pre-classifier
+    """
+    if 'filename' in job:
+        emit(job)
+        return
+
+    # Special handling for Rezepte directory
+    if job['path'].parent.name == 'Rezepte':
+        recipe_filename = get_recipe_name(api_url, job['content'], api_token)
+        if not recipe_filename:
+            recipe_filename = f'Rezept_{random.randint(1, 10000000)}.pdf'
+        job['filename'] = recipe_filename
+        job['category'] = 'Rezepte'
+    else:
+        result = name_document(job['content'], names_tuple, categories, api_url, api_token,
+                               job['header_only'], classifier)
+        if result is not None:
+            job['filename'], job['category'] = result
+    emit(job)
+
+
+def upload_stage(job: Dict[str, Any], emit: Callable[[Dict[str, Any]], None],
+                 config: Config, archive_directory: Path) -> None:
+    """
+    Pipeline stage: upload a named document to kDrive and move it to the archive.
+
+    Args:
+        job: Pipeline job with 'filename' and 'category'
+        emit: Unused, this is the last stage
+        config: Configuration object
+        archive_directory: Where uploaded files are moved to
+    """
+    file_path = job['path']
+    directory = file_path.parent
+    filename, category = job['filename'], job['category']
+
+    # Special handling for specific directories
+    if directory.name == 'Steuern':
+        try_upload(str(directory), file_path.name, filename,
+                 'Dokumente für Steuern 2025', config)
+
+    if directory.name == '1und1macht3':
+        try_upload(str(directory), file_path.name, filename, '1und1macht3', config)
+
+    # Upload to category folder
+    success, actual_filename = try_upload(str(directory), file_path.name, filename, category, config)
+    if success:
+        shutil.move(str(file_path), str(archive_directory / actual_filename))
+        count_run_stat('uploaded')
+        elapsed = time.time() - job['start_time']
+        logger.info(f"{file_path.name} -> {actual_filename} [{category}] ({elapsed:.1f}s)")
+    else:
+        count_run_stat('failed')
+
+
+def collect_input_files(input_directory: Path, split_pages: bool = False) -> List[Path]:
+    """
+    List the PDFs waiting in the category subdirectories of input.
+
+    Args:
+        input_directory: Directory with one subdirectory per category
+        split_pages: If True, split multi-page PDFs into one file per page
+
+    Returns:
+        PDF paths
+    """
+    pdf_files = []
+    for directory in input_directory.iterdir():
+        if not directory.is_dir():
+            continue
+
+        logger.debug(f"Processing directory: {directory}")
+
+        # Collect PDF files from directory
+        directory_files = [f for f in directory.iterdir()
+                           if f.is_file() and f.suffix.lower() == '.pdf']
+
+        # Split multi-page PDFs into individual pages if enabled
+        if split_pages:
+            expanded_files = []
+            for pdf_file in directory_files:
+                expanded_files.extend(split_pdf_into_pages(pdf_file))
+            directory_files = expanded_files
+
+        pdf_files.extend(directory_files)
+    return pdf_files
+
+
+def log_run_statistics(download_counts: Tuple[int, int, int, int],
+                       pipeline_stats: Optional[Dict[str, Dict[str, float]]] = None) -> None:
+    """
+    Log the statistics collected in run_stats, prompt_stats, the LLM
+    limiter, the prompt history and the processing pipeline.
+
+    Args:
+        download_counts: Attachments downloaded per category
+            (Ablegen, Steuern, 1und1macht3, Rezepte)
+        pipeline_stats: Stage counters from Pipeline.stats, if any
+    """
+    logger.info("=" * 50)
+    logger.info("Run statistics:")
+    logger.info(f"  Downloaded:  Ablegen={download_counts[0]}, Steuern={download_counts[1]}, "
+                f"1und1macht3={download_counts[2]}, Rezepte={download_counts[3]}")
+    logger.info(f"  Split:       {run_stats['split']} PDFs -> {run_stats['split_pages_total']} pages")
+    logger.info(f"  Text source: {run_stats['text_layer']} text layer, {run_stats['ocr']} OCR, "
+                f"{run_stats['header_ocr']} header OCR, {run_stats['ocr_cache_hits']} OCR cache hits")
+    logger.info(f"  Rotated:     {run_stats['rotated']} PDFs corrected")
+    raster_stats = raster_budget.stats()
+    logger.info(f"  Raster est.: peak {raster_stats['peak'] / (1024 * 1024):.0f} MB reserved "
+                f"of {raster_stats['capacity'] / (1024 * 1024):.0f} MB (estimated, all documents)")
+    logger.info(f"  Condensed:   {run_stats['raw_tokens']} to {run_stats['prompt_tokens']} estimated tokens")
+    logger.info(f"  Uploaded:    {run_stats['uploaded']} successful, {run_stats['failed']} failed")
+    logger.info(f"  LLM cache:   {run_stats['llm_cache_hits']} hits")
+    limiter_stats = llm_limiter.stats()
+    logger.info(f"  LLM limiter: {limiter_stats['throttled']} throttled, {limiter_stats['errors']} errors, "
+                f"max queue {limiter_stats['max_queue_depth']}, waited {limiter_stats['wait_seconds']:.0f}s, "
+                f"final limit {limiter_stats['concurrency_limit']} in flight at {limiter_stats['rate']:.2f} req/s")
+    logger.info(f"  Preclassify: {run_stats['preclassified']}/{run_stats['preclassifier_checked']} skipped LLM vote, "
+                f"agreed with LLM {run_stats['preclassifier_agreed']}/{run_stats['preclassifier_compared']}")
+    logger.info(f"  LLM prompts: Name {prompt_stats['name']}, Category {prompt_stats['category']}, Recipe {prompt_stats['recipe']}, "
+                f"Combined {prompt_stats['combined']}")
+    for kind in ('name', 'category', 'recipe'):
+        logger.info(f"  Templates:   {kind}: {prompt_history.summary(kind)}")
+    for line in Pipeline.format_stats(pipeline_stats or {}):
+        logger.info(f"  Stage:       {line}")
+    logger.info("=" * 50)
+
+
 def main() -> None:
     """Main execution function."""
     SPLIT_PAGES_INDIVIDUALLY = False
     AUTO_ROTATE = False
+    DAEMON_MODE = False  # Keep running and process scans as soon as they arrive (IMAP IDLE)
 
     input_directory = Path('input')
     archive_directory = Path('Archive')
@@ -773,8 +2337,6 @@ def main() -> None:
         logger.error(f"Failed to load config: {e}")
         return
 
-    download_counts = EmailManager.init_and_download(config)
-
     names = config.NAMES
     lastname = config.LASTNAME
     names_tuple = (names, lastname)
@@ -784,77 +2346,72 @@ def main() -> None:
     product_id = config.AI_PRODUCT_ID
     api_url = f"https://api.infomaniak.com/1/ai/{product_id}/openai/chat/completions"
 
-    # Process each subdirectory in input
-    for directory in input_directory.iterdir():
-        if not directory.is_dir():
-            continue
-
-        logger.debug(f"Processing directory: {directory}")
-
-        # Collect PDF files from directory
-        pdf_files = [f for f in directory.iterdir()
-                     if f.is_file() and f.suffix.lower() == '.pdf']
+    classifier = None
+    if PRECLASSIFIER_ENABLED:
+        classifier = CategoryClassifier.CategoryClassifier(
+            list(categories.keys()), getattr(config, 'CATEGORY_KEYWORDS', None),
+            CLASSIFIER_HISTORY_PATH
+        )
+
+    naming = functools.partial(naming_stage, names_tuple=names_tuple, categories=categories,
+                               api_url=api_url, api_token=api_token, classifier=classifier)
+    stages = [
+        ('ocr', functools.partial(extract_text_stage, names_tuple=names_tuple, auto_rotate=AUTO_ROTATE),
+         PIPELINE_OCR_WORKERS),
+        ('llm', naming, PIPELINE_LLM_WORKERS),
+    ]
+    if OCR_PROFILE == 'fast':
+        # Documents whose header gave no name get their full OCR in a stage of its own,
+        # so CPU-bound OCR never occupies the LLM workers
+        stages += [
+            ('ocr-full', functools.partial(full_text_stage, names_tuple=names_tuple, auto_rotate=AUTO_ROTATE),
+             PIPELINE_OCR_WORKERS),
+            ('llm-full', naming, PIPELINE_LLM_WORKERS),
+        ]
+    stages.append(('upload', functools.partial(upload_stage, config=config, archive_directory=archive_directory),
+                   PIPELINE_UPLOAD_WORKERS))
+    pipeline = Pipeline.Pipeline(stages, PIPELINE_QUEUE_SIZE, on_error=job_failed)
+    pipeline.start()
+
+    def submit_download(file_path: Path) -> None:
+        # Called by the IMAP download as soon as an attachment is on disk
+        page_files = split_pdf_into_pages(file_path) if SPLIT_PAGES_INDIVIDUALLY else [file_path]
+        for page_file in page_files:
+            pipeline.submit(create_job(page_file))
+
+    def save_learned_state() -> None:
+        if classifier is not None:
+            classifier.save()
+        prompt_history.save()
+
+    # Files left over from an earlier run go first; new downloads only add new files
+    try:
+        for file_path in collect_input_files(input_directory, SPLIT_PAGES_INDIVIDUALLY):
+            pipeline.submit(create_job(file_path))
 
-        # Split multi-page PDFs into individual pages if enabled
-        if SPLIT_PAGES_INDIVIDUALLY:
-            expanded_files = []
-            for pdf_file in pdf_files:
-                expanded_files.extend(split_pdf_into_pages(pdf_file))
-            pdf_files = expanded_files
+        # The download runs on this thread and feeds the pipeline while it works
+        if DAEMON_MODE:
+            download_totals = {category: 0 for category in EmailManager.EMAIL_SUBJECTS}
 
-        for file_path in pdf_files:
-            start_time = time.time()
+            def on_download(download_counts: Dict[str, int]) -> None:
+                for category, count in download_counts.items():
+                    download_totals[category] += count
+                save_learned_state()
 
             try:
-                # Special handling for Rezepte directory
-                if directory.name == 'Rezepte':
-                    content, was_rotated = ocr_file(str(file_path), AUTO_ROTATE)
-                    if was_rotated:
-                        run_stats['rotated'] += 1
-                    content = content[:2000]
-                    recipe_filename = get_recipe_name(api_url, content, api_token)
-                    if not recipe_filename:
-                        recipe_filename = f'Rezept_{random.randint(1, 10000000)}.pdf'
-                    filename = recipe_filename
-                    category = 'Rezepte'
-                else:
-                    filename, category = process_document(
-                        str(file_path), names_tuple, categories, api_url, api_token,
-                        AUTO_ROTATE
-                    )
-
-                # Special handling for specific directories
-                if directory.name == 'Steuern':
-                    try_upload(str(directory), file_path.name, filename,
-                             'Dokumente für Steuern 2025', config)
-
-                if directory.name == '1und1macht3':
-                    try_upload(str(directory), file_path.name, filename, '1und1macht3', config)
-
-                # Upload to category folder
-                success, actual_filename = try_upload(str(directory), file_path.name, filename, category, config)
-                if success:
-                    shutil.move(str(file_path), str(archive_directory / actual_filename))
-                    run_stats['uploaded'] += 1
-                    elapsed = time.time() - start_time
-                    logger.info(f"{file_path.name} -> {actual_filename} [{category}] ({elapsed:.1f}s)")
-                else:
-                    run_stats['failed'] += 1
-
-            except Exception as e:
-                run_stats['failed'] += 1
-                logger.error(f"Error processing {file_path.name}: {e}")
+                EmailManager.watch_inbox(config, on_download, on_saved=submit_download)
+            except KeyboardInterrupt:
+                logger.info("Stopped watching the inbox, finishing queued documents")
+            download_counts = tuple(download_totals[c] for c in ('Ablegen', 'Steuern', '1und1macht3', 'Rezepte'))
+        else:
+            download_counts = EmailManager.init_and_download(config, on_saved=submit_download)
+    finally:
+        # Let queued documents finish even if the download failed
+        pipeline.close()
+        save_learned_state()
 
     # Final statistics
-    logger.info("=" * 50)
-    logger.info("Run statistics:")
-    logger.info(f"  Downloaded:  Ablegen={download_counts[0]}, Steuern={download_counts[1]}, "
-                f"1und1macht3={download_counts[2]}, Rezepte={download_counts[3]}")
-    logger.info(f"  Split:       {run_stats['split']} PDFs -> {run_stats['split_pages_total']} pages")
-    logger.info(f"  Rotated:     {run_stats['rotated']} PDFs corrected")
-    logger.info(f"  Uploaded:    {run_stats['uploaded']} successful, {run_stats['failed']} failed")
-    logger.info(f"  LLM prompts: Name {prompt_stats['name']}, Category {prompt_stats['category']}, Recipe {prompt_stats['recipe']}")
-    logger.info("=" * 50)
+    log_run_statistics(download_counts, pipeline.stats())
 
 
 if __name__ == '__main__':